@@ -1,11 +1,52 @@
+import re
 import time
+import tracemalloc
 import json
-from pymongo import MongoClient
+import argparse
+from pathlib import Path
+from datetime import timedelta
 from dotenv import load_dotenv
 import os
-import psycopg2
-from urllib.parse import urlparse
 import pandas as pd
+import yaml
+from connexion import (
+    close_all,
+    get_mongo_client,
+    get_pg_connection,
+    release_pg_connection,
+)
+from benchmark import (
+    BenchConfig,
+    compare_runs,
+    flatten_results,
+    load_results,
+    run_benchmark,
+    save_results,
+)
+from import_donnes_mogo_to_postgres import (
+    ID_TO_HEX,
+    ID_TYPES,
+    TIME_INDEXES,
+    chunked,
+    ensure_table,
+    ensure_time_indexes,
+    make_inserter,
+    table_id_type,
+    time_index_name,
+)
+from plans import (
+    format_plan,
+    format_plan_diff,
+    normalize_mongo_plan,
+    normalize_postgres_plan,
+)
+from query_cache import (
+    cached_aggregate,
+    cached_fetchall,
+    cached_find,
+    get_cache,
+    mongo_source,
+)
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -16,13 +57,47 @@ Supabase_url = os.getenv("SUPABASE_URL")
 DB_NAME = os.getenv("MONGO_DB")
 COLLECTION_NAME = os.getenv("MONGO_COLLECTION")
 
+# Réglages du harness (warmup, itérations, vidage de cache), modifiés par la CLI
+BENCH = BenchConfig()
+
+# Lecture en streaming (curseur serveur / lots) : taille des lots, 0 = tout
+# charger en mémoire (fetchall / list)
+STREAM_BATCH_SIZE = 0
+
+# Cache de résultats (query_cache.QueryCache) activé par --cache : chaque mesure
+# est refaite à travers le cache dans une entrée "(cache)" à part ; None = pas
+# de mesure avec cache
+CACHE = None
+
+
+def peak_memory_mb(fn):
+    """Pic de mémoire allouée par Python pendant `fn()` (Mo), par tracemalloc
+
+    Le pic est remis à zéro avant l'appel et compté au-dessus de la mémoire
+    déjà allouée : il ne dépend ni des requêtes précédentes ni du reste du
+    processus. Les tampons C (libpq, BSON) ne sont pas comptés, seulement les
+    objets Python (lignes, documents) qu'ils produisent.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        fn()
+        return (tracemalloc.get_traced_memory()[1] - before) / (1024 * 1024)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
 # ========== FONCTIONS MONGODB ==========
 
 
 def connect_mongodb():
-    """Établir la connexion à MongoDB"""
+    """Retourner le client MongoDB partagé (créé une seule fois, ne pas le fermer)"""
     try:
-        client = MongoClient(Mongo_url, serverSelectionTimeoutMS=5000)
+        client = get_mongo_client(Mongo_url, serverSelectionTimeoutMS=5000)
         client.admin.command("ping")
         return client
     except Exception as e:
@@ -30,34 +105,71 @@ def connect_mongodb():
         raise
 
 
-def query_mongodb_with_explain(client, query_filter=None):
-    """Exécuter une requête MongoDB avec explain() et mesurer le temps"""
+def explain_mongodb(client, query_filter=None, pipeline=None):
+    """Plan d'exécution MongoDB (explain "executionStats") au format commun de plans.py"""
+    try:
+        db = client[DB_NAME]
+        if pipeline is not None:
+            command = {"aggregate": COLLECTION_NAME, "pipeline": pipeline, "cursor": {}}
+        else:
+            command = {"find": COLLECTION_NAME, "filter": query_filter or {}}
+        explain = db.command("explain", command, verbosity="executionStats")
+        return normalize_mongo_plan(explain)
+    except Exception as e:
+        print(f"Erreur explain MongoDB: {e}")
+        raise
+
+
+def query_mongodb_with_explain(
+    client, query_filter=None, stream_batch_size=None, explain=True, cache=None
+):
+    """Exécuter une requête MongoDB avec explain() et mesurer le temps
+
+    Avec `stream_batch_size` (par défaut STREAM_BATCH_SIZE), les documents sont
+    parcourus par lots sans être gardés en mémoire et le temps jusqu'au premier
+    document est mesuré à part. `explain=False` saute la capture du plan (voir
+    `run_measured`, qui ne la fait qu'une fois par série). Avec `cache` (hors
+    streaming), le résultat est lu dans ce cache s'il y est.
+    """
     try:
         if query_filter is None:
             query_filter = {}  # Sélectionner tous les documents
+        if stream_batch_size is None:
+            stream_batch_size = STREAM_BATCH_SIZE
 
         db = client[DB_NAME]
         collection = db[COLLECTION_NAME]
 
         # Mesurer le temps d'exécution
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
+        first_row_time = None
 
         # Exécuter la requête
-        results = list(collection.find(query_filter))
+        if stream_batch_size:
+            rows_returned = 0
+            for _ in collection.find(query_filter, batch_size=stream_batch_size):
+                if first_row_time is None:
+                    first_row_time = time.perf_counter_ns()
+                rows_returned += 1
+        elif cache is not None:
+            rows_returned = len(cached_find(collection, query_filter, cache))
+        else:
+            rows_returned = len(list(collection.find(query_filter)))
 
-        end_time = time.time()
-        execution_time = (end_time - start_time) * 1000  # Convertir en ms
+        end_time = time.perf_counter_ns()
+        execution_time = (end_time - start_time) / 1e6  # Convertir en ms
 
-        # Obtenir les stats d'explain
-        explain_stats = collection.aggregate(
-            [{"$match": query_filter}, {"$group": {"_id": None, "count": {"$sum": 1}}}]
-        )
-        explain_results = list(explain_stats)
+        # Obtenir le plan d'exécution
+        plan = explain_mongodb(client, query_filter) if explain else None
 
         return {
             "execution_time_ms": execution_time,
-            "rows_returned": len(results),
-            "explain_info": f"Documents scannés: {len(results)}",
+            "first_row_ms": (
+                (first_row_time - start_time) / 1e6 if first_row_time else None
+            ),
+            "rows_returned": rows_returned,
+            "plan": plan,
+            "explain_info": format_plan(plan) if plan else None,
             "database": "MongoDB",
         }
 
@@ -87,57 +199,97 @@ def get_mongodb_collection_stats(client):
 
 
 def connect_supabase():
-    """Établir la connexion à Supabase"""
+    """Emprunter une connexion Supabase au pool partagé"""
     try:
-        parsed = urlparse(Supabase_url)
-        connection = psycopg2.connect(
-            host=parsed.hostname,
-            port=parsed.port,
-            database=parsed.path.lstrip("/"),
-            user=parsed.username,
-            password=parsed.password,
-        )
-        return connection
+        return get_pg_connection(Supabase_url)
     except Exception as e:
         print(f"Erreur connexion Supabase: {e}")
         raise
 
 
-def query_supabase_with_explain(connection, query_sql, params=None):
-    """Exécuter une requête Supabase avec EXPLAIN ANALYZE et mesurer le temps"""
+def release_supabase(connection):
+    """Rendre la connexion au pool (à la place de close())"""
+    release_pg_connection(connection, Supabase_url)
+
+
+def explain_supabase(connection, query_sql, params=None):
+    """Plan d'exécution Postgres (EXPLAIN ANALYZE, BUFFERS, JSON) au format commun de plans.py"""
     try:
         cursor = connection.cursor()
+        cursor.execute(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query_sql}", params or None
+        )
+        explain_json = cursor.fetchone()[0]
+        cursor.close()
+        return normalize_postgres_plan(explain_json)
+    except Exception as e:
+        print(f"Erreur explain Supabase: {e}")
+        raise
 
-        # Mesurer le temps d'exécution de la requête normale
-        start_time = time.time()
-
-        if params:
-            cursor.execute(query_sql, params)
-        else:
-            cursor.execute(query_sql)
 
-        results = cursor.fetchall()
-        end_time = time.time()
-        execution_time = (end_time - start_time) * 1000  # Convertir en ms
+def query_supabase_with_explain(
+    connection,
+    query_sql,
+    params=None,
+    stream_batch_size=None,
+    explain=True,
+    source="mongo_import",
+    cache=None,
+):
+    """Exécuter une requête Supabase avec EXPLAIN ANALYZE et mesurer le temps
+
+    Avec `stream_batch_size` (par défaut STREAM_BATCH_SIZE), les lignes sont lues
+    par un curseur serveur (nommé, `itersize` lignes par aller-retour) au lieu
+    de fetchall(), et le temps jusqu'à la première ligne est mesuré à part.
+    `explain=False` saute la capture du plan (voir `run_measured`).
+    Avec `cache` (hors streaming), le résultat est lu dans ce cache s'il y est
+    (`source` = table lue, pour l'invalidation).
+    """
+    try:
+        if stream_batch_size is None:
+            stream_batch_size = STREAM_BATCH_SIZE
 
-        # Exécuter EXPLAIN ANALYZE
-        explain_query = f"EXPLAIN ANALYZE {query_sql}"
-        if params:
-            cursor.execute(explain_query, params)
+        # Mesurer le temps d'exécution de la requête normale
+        start_time = time.perf_counter_ns()
+        first_row_time = None
+
+        if stream_batch_size:
+            stream_cursor = connection.cursor(name="test_perf_stream")
+            stream_cursor.itersize = stream_batch_size
+            stream_cursor.execute(query_sql, params or None)
+            rows_returned = 0
+            for _ in stream_cursor:
+                if first_row_time is None:
+                    first_row_time = time.perf_counter_ns()
+                rows_returned += 1
+            stream_cursor.close()
+        elif cache is not None:
+            rows_returned = len(
+                cached_fetchall(connection, query_sql, params, (source,), cache)
+            )
         else:
-            cursor.execute(explain_query)
-
-        explain_results = cursor.fetchall()
+            cursor = connection.cursor()
+            if params:
+                cursor.execute(query_sql, params)
+            else:
+                cursor.execute(query_sql)
+            rows_returned = len(cursor.fetchall())
+            cursor.close()
 
-        cursor.close()
+        end_time = time.perf_counter_ns()
+        execution_time = (end_time - start_time) / 1e6  # Convertir en ms
 
-        # Parser les résultats d'EXPLAIN
-        explain_text = "\n".join([row[0] for row in explain_results])
+        # Obtenir le plan d'exécution (EXPLAIN ANALYZE en JSON)
+        plan = explain_supabase(connection, query_sql, params) if explain else None
 
         return {
             "execution_time_ms": execution_time,
-            "rows_returned": len(results),
-            "explain_info": explain_text,
+            "first_row_ms": (
+                (first_row_time - start_time) / 1e6 if first_row_time else None
+            ),
+            "rows_returned": rows_returned,
+            "plan": plan,
+            "explain_info": format_plan(plan) if plan else None,
             "database": "Supabase (PostgreSQL)",
         }
 
@@ -146,186 +298,147 @@ def query_supabase_with_explain(connection, query_sql, params=None):
         raise
 
 
-def get_supabase_table_stats(connection):
-    """Obtenir les statistiques de la table Supabase"""
+def get_supabase_table_stats(connection, table="mongo_import"):
+    """Obtenir les statistiques de la table Supabase
+
+    Tailles : `table_size` = total (données + TOAST + index), `heap_size` =
+    données seules, `index_size` = tous les index (dont la clé primaire) ;
+    les champs `*_bytes` donnent les mêmes tailles en octets.
+    """
     try:
         cursor = connection.cursor()
 
         # Nombre de lignes
-        cursor.execute("SELECT COUNT(*) FROM mongo_import")
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
         row_count = cursor.fetchone()[0]
 
-        # Taille de la table
+        # Taille de la table et des index
         cursor.execute(
             """
-            SELECT pg_size_pretty(pg_total_relation_size('mongo_import')) as size
-        """
+            SELECT pg_total_relation_size(%(table)s),
+                   pg_relation_size(%(table)s),
+                   pg_indexes_size(%(table)s)
+        """,
+            {"table": table},
         )
-        table_size = cursor.fetchone()[0]
+        total_bytes, heap_bytes, index_bytes = cursor.fetchone()
 
         cursor.close()
 
         return {
-            "table_name": "mongo_import",
+            "table_name": table,
             "row_count": row_count,
-            "table_size": table_size,
+            "id_type": table_id_type(connection, table),
+            "table_size": pretty_size(total_bytes),
+            "heap_size": pretty_size(heap_bytes),
+            "index_size": pretty_size(index_bytes),
+            "table_size_bytes": total_bytes,
+            "heap_size_bytes": heap_bytes,
+            "index_size_bytes": index_bytes,
         }
     except Exception as e:
         print(f"Erreur stats Supabase: {e}")
         raise
 
 
-# ========== FONCTIONS DE COMPARAISON ==========
-
-
-def compare_simple_select():
-    """Comparer les performances d'un SELECT simple sur les deux bases"""
-    try:
-        print("\n" + "=" * 70)
-        print("TEST 1: SELECT SIMPLE (récupérer tous les documents/lignes)")
-        print("=" * 70 + "\n")
-
-        # MongoDB
-        print("MONGODB - Exécution du SELECT...")
-        mongo_client = connect_mongodb()
-        mongo_result = query_mongodb_with_explain(mongo_client, {})
-        mongo_client.close()
-
-        print(f"Temps d'exécution: {mongo_result['execution_time_ms']:.2f} ms")
-        print(f"Lignes retournées: {mongo_result['rows_returned']}")
-
-        # Supabase
-        print("\nSUPABASE - Exécution du SELECT...")
-        supabase_conn = connect_supabase()
-        supabase_result = query_supabase_with_explain(
-            supabase_conn, "SELECT lattitude, longitude, timestamp FROM mongo_import"
-        )
-        supabase_conn.close()
+def pretty_size(size_bytes):
+    """Taille lisible, comme pg_size_pretty"""
+    for unit in ("octets", "Ko", "Mo"):
+        if size_bytes < 10 * 1024:
+            return f"{size_bytes:.0f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.0f} Go"
 
-        print(f"Temps d'exécution: {supabase_result['execution_time_ms']:.2f} ms")
-        print(f"Lignes retournées: {supabase_result['rows_returned']}")
 
-        # Comparaison
-        return {
-            "test": "SELECT Simple",
-            "mongodb": mongo_result,
-            "supabase": supabase_result,
-        }
-
-    except Exception as e:
-        print(f"Erreur lors du test: {e}")
-        raise
+# ========== MESURE ==========
 
 
-def compare_filtered_query():
-    """Comparer les performances d'une requête filtrée"""
-    try:
-        print("\n" + "=" * 70)
-        print("TEST 2: SELECT AVEC FILTRE (lattitude > 0)")
-        print("=" * 70 + "\n")
+def run_measured(query_fn, config: BenchConfig | None = None, plan_fn=None):
+    """Exécuter `query_fn` selon le harness (cold, warmup, itérations).
 
-        # MongoDB
-        print("MONGODB - Exécution du SELECT avec filtre...")
-        mongo_client = connect_mongodb()
-        mongo_result = query_mongodb_with_explain(
-            mongo_client, {"iss_position.lattitude": {"$gt": 0}}
-        )
-        mongo_client.close()
+    `query_fn` renvoie un dict avec `execution_time_ms`. On garde le résultat
+    du premier appel, complété par `stats` ; `execution_time_ms` devient le p50.
+    `plan_fn` (ex. `explain_supabase`) capture le plan une seule fois, après
+    les mesures, au lieu d'un EXPLAIN ANALYZE à chaque itération. Le pic
+    mémoire (`peak_memory_mb`) vient d'un appel de plus, hors chronométrage
+    (tracemalloc ralentit les allocations).
+    """
+    results = []
+
+    def sample():
+        result = query_fn()
+        results.append(result)
+        return result["execution_time_ms"]
+
+    stats = run_benchmark(sample, config or BENCH)
+    result = results[0]
+    result["stats"] = stats
+    result["execution_time_ms"] = stats["p50_ms"]
+    first_rows = [r["first_row_ms"] for r in results if r.get("first_row_ms")]
+    if first_rows:
+        stats["first_row_p50_ms"] = float(pd.Series(first_rows).median())
+    result["peak_memory_mb"] = peak_memory_mb(query_fn)
+    if plan_fn is not None:
+        result["plan"] = plan_fn()
+        result["explain_info"] = format_plan(result["plan"])
+    return result
+
+
+def print_stats(stats):
+    print(
+        f"Temps d'exécution (p50): {stats['p50_ms']:.2f} ms | "
+        f"p95 {stats['p95_ms']:.2f} | p99 {stats['p99_ms']:.2f} | "
+        f"écart-type {stats['std_ms']:.2f} | "
+        f"IC95 [{stats['ci95_low_ms']:.2f}, {stats['ci95_high_ms']:.2f}] | "
+        f"cold {stats['cold_ms']:.2f} | outliers {stats['outliers']}/{stats['count']}"
+    )
+    if "first_row_p50_ms" in stats:
+        print(f"Premier résultat (p50): {stats['first_row_p50_ms']:.2f} ms")
 
-        print(f"Temps d'exécution: {mongo_result['execution_time_ms']:.2f} ms")
-        print(f"Lignes retournées: {mongo_result['rows_returned']}")
 
-        # Supabase
-        print("\nSUPABASE - Exécution du SELECT avec filtre...")
-        supabase_conn = connect_supabase()
-        supabase_result = query_supabase_with_explain(
-            supabase_conn,
-            "SELECT lattitude, longitude, timestamp FROM mongo_import WHERE lattitude > 0",
-        )
-        supabase_conn.close()
+def print_peak_memory(result):
+    if result.get("peak_memory_mb") is not None:
+        print(f"Pic mémoire de la requête: {result['peak_memory_mb']:.1f} Mo")
 
-        print(f"Temps d'exécution: {supabase_result['execution_time_ms']:.2f} ms")
-        print(f"Lignes retournées: {supabase_result['rows_returned']}")
 
-        # Comparaison
-        return {
-            "test": "SELECT avec Filtre",
-            "mongodb": mongo_result,
-            "supabase": supabase_result,
+# COUNT et moyenne de lattitude
+DEFAULT_PIPELINE = [
+    {
+        "$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "avg_lattitude": {"$avg": "$iss_position.lattitude"},
         }
+    }
+]
+
+
+def aggregate_mongodb(client, pipeline=None, cache=None):
+    """Exécuter un pipeline d'agrégation MongoDB (COUNT/AVG par défaut)"""
+    collection = client[DB_NAME][COLLECTION_NAME]
+    start_time = time.perf_counter_ns()
+    if cache is not None:
+        agg_results = cached_aggregate(collection, pipeline or DEFAULT_PIPELINE, cache)
+    else:
+        agg_results = list(collection.aggregate(pipeline or DEFAULT_PIPELINE))
+    end_time = time.perf_counter_ns()
+    return {
+        "execution_time_ms": (end_time - start_time) / 1e6,
+        "rows_returned": len(agg_results),
+        "result": agg_results[0] if agg_results else None,
+        "database": "MongoDB",
+    }
 
-    except Exception as e:
-        print(f"Erreur lors du test: {e}")
-        raise
-
-
-def compare_aggregation():
-    """Comparer les performances d'une agrégation (COUNT, AVG)"""
-    try:
-        print("\n" + "=" * 70)
-        print("TEST 3: AGRÉGATION (COUNT et moyenne de lattitude)")
-        print("=" * 70 + "\n")
-
-        # MongoDB
-        print("MONGODB - Exécution de l'agrégation...")
-        mongo_client = connect_mongodb()
-
-        db = mongo_client[DB_NAME]
-        collection = db[COLLECTION_NAME]
-
-        start_time = time.time()
-        agg_results = list(
-            collection.aggregate(
-                [
-                    {
-                        "$group": {
-                            "_id": None,
-                            "count": {"$sum": 1},
-                            "avg_lattitude": {"$avg": "$iss_position.lattitude"},
-                        }
-                    }
-                ]
-            )
-        )
-        end_time = time.time()
-
-        mongo_time = (end_time - start_time) * 1000
-        mongo_client.close()
 
-        print(f"Temps d'exécution: {mongo_time:.2f} ms")
-        if agg_results:
-            count = agg_results[0].get("count", 0)
-            avg_lat = agg_results[0].get("avg_lattitude", 0)
-            if avg_lat is not None:
-                print(f"Résultat: Count={count}, Avg Lat={avg_lat:.4f}")
-            else:
-                print(f"Résultat: Count={count}, Avg Lat=N/A")
-
-        # Supabase
-        print("\nSUPABASE - Exécution de l'agrégation...")
-        supabase_conn = connect_supabase()
-        supabase_result = query_supabase_with_explain(
-            supabase_conn,
-            "SELECT COUNT(*) as count, AVG(lattitude) as avg_lattitude FROM mongo_import",
-        )
-        supabase_conn.close()
-
-        print(f"Temps d'exécution: {supabase_result['execution_time_ms']:.2f} ms")
-
-        # Comparaison
-        return {
-            "test": "Agrégation",
-            "mongodb": {"execution_time_ms": mongo_time, "database": "MongoDB"},
-            "supabase": supabase_result,
-        }
+# ========== FONCTIONS DE COMPARAISON ==========
 
-    except Exception as e:
-        print(f"Erreur lors du test: {e}")
-        raise
 
+def display_summary(results_list, baseline=None, threshold: float = 0.10):
+    """Afficher un résumé comparatif de tous les tests
 
-def display_summary(results_list):
-    """Afficher un résumé comparatif de tous les tests"""
+    `baseline` : résultats d'un run précédent (`load_results`) pour comparer
+    les p50 et signaler les régressions au-delà de `threshold`.
+    """
     print("\n" + "=" * 70)
     print("RÉSUMÉ COMPARATIF")
     print("=" * 70 + "\n")
@@ -356,6 +469,27 @@ def display_summary(results_list):
 
     print("\nNote: Un ratio > 1 = MongoDB plus lent | Ratio < 1 = Supabase plus lent")
 
+    if baseline:
+        comparison = compare_runs(flatten_results(results_list), baseline, threshold)
+        print("\nCOMPARAISON AVEC LE RUN DE RÉFÉRENCE (p50)\n")
+        df = pd.DataFrame(
+            [
+                {
+                    "Test": row["test"],
+                    "Base": row["database"],
+                    "Référence (ms)": f"{row['baseline_p50_ms']:.2f}",
+                    "Actuel (ms)": f"{row['p50_ms']:.2f}",
+                    "Écart": f"{row['delta']:+.1%}",
+                    "Statut": "RÉGRESSION" if row["regression"] else "ok",
+                }
+                for row in comparison
+            ]
+        )
+        print(df.to_string(index=False) if not df.empty else "Aucun test commun")
+        regressions = [row for row in comparison if row["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) au-delà de {threshold:.0%}")
+
 
 def display_stats():
     """Afficher les statistiques des bases"""
@@ -368,7 +502,6 @@ def display_stats():
     try:
         mongo_client = connect_mongodb()
         mongo_stats = get_mongodb_collection_stats(mongo_client)
-        mongo_client.close()
 
         print(f"  Collection: {mongo_stats['collection_name']}")
         print(f"  Nombre de documents: {mongo_stats['document_count']}")
@@ -382,11 +515,16 @@ def display_stats():
     try:
         supabase_conn = connect_supabase()
         supabase_stats = get_supabase_table_stats(supabase_conn)
-        supabase_conn.close()
+        release_supabase(supabase_conn)
 
         print(f"  Table: {supabase_stats['table_name']}")
         print(f"  Nombre de lignes: {supabase_stats['row_count']}")
-        print(f"  Taille de la table: {supabase_stats['table_size']}")
+        print(f"  Type de id: {supabase_stats['id_type']}")
+        print(
+            f"  Taille de la table: {supabase_stats['table_size']} "
+            f"(données {supabase_stats['heap_size']}, "
+            f"index {supabase_stats['index_size']})"
+        )
     except Exception as e:
         print(f"Erreur: {e}")
 
@@ -394,13 +532,19 @@ def display_stats():
 # ========== INDEX HELPERS ==========
 
 
-def create_mongo_index(client, field_name: str, index_name: str | None = None):
+def create_mongo_index(
+    client, field_name: str, index_name: str | None = None, index_type=1
+):
     db = client[DB_NAME]
     coll = db[COLLECTION_NAME]
-    idx = coll.create_index([(field_name, 1)], name=index_name)
+    idx = coll.create_index([(field_name, index_type)], name=index_name)
     return idx
 
 
+def mongo_index_exists(client, index_name: str) -> bool:
+    return index_name in client[DB_NAME][COLLECTION_NAME].index_information()
+
+
 def drop_mongo_index(client, index_name: str):
     db = client[DB_NAME]
     coll = db[COLLECTION_NAME]
@@ -410,13 +554,26 @@ def drop_mongo_index(client, index_name: str):
         pass
 
 
-def create_postgres_index(conn, table: str, column: str, index_name: str):
+def create_postgres_index(
+    conn, table: str, column: str, index_name: str, using: str | None = None
+):
+    method = f" USING {using}" if using else ""
     cur = conn.cursor()
-    cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})")
+    cur.execute(
+        f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}{method} ({column})"
+    )
     conn.commit()
     cur.close()
 
 
+def postgres_index_exists(conn, index_name: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (index_name,))
+        exists = cur.fetchone()[0] is not None
+    conn.rollback()
+    return exists
+
+
 def drop_postgres_index(conn, index_name: str):
     cur = conn.cursor()
     try:
@@ -427,140 +584,540 @@ def drop_postgres_index(conn, index_name: str):
     cur.close()
 
 
-def compare_index_effect(field_mongo: str, column_pg: str, filter_value, runs: int = 3):
-    """Compare filtered query times without index then with index.
+def print_plan_diffs(before, after):
+    """Afficher l'évolution des plans (sans index -> avec index) des deux bases"""
+    print("\n-- Évolution des plans --")
+    for key in ("mongodb", "supabase"):
+        plan_before = before[key].get("plan")
+        plan_after = after[key].get("plan")
+        if plan_before and plan_after:
+            print(f"{before[key]['database']}:")
+            print(
+                format_plan_diff(
+                    plan_before, plan_after, labels=("sans index", "avec index")
+                )
+            )
+
+
+# ========== INDEX SUR TIMESTAMP ==========
+
+# Requêtes de temps sur les dernières données ; %(start)s / %(end)s sont
+# calculés à partir du max(timestamp) de la table
+TIME_QUERIES = {
+    "Plage 1 h": (
+        "SELECT timestamp, lattitude, longitude FROM {table} "
+        "WHERE timestamp >= %(start)s AND timestamp < %(end)s",
+        3600,
+    ),
+    "Plage 1 jour": (
+        "SELECT timestamp, lattitude, longitude FROM {table} "
+        "WHERE timestamp >= %(start)s AND timestamp < %(end)s",
+        86400,
+    ),
+    "100 dernières positions": (
+        "SELECT timestamp, lattitude, longitude FROM {table} "
+        "ORDER BY timestamp DESC LIMIT 100",
+        None,
+    ),
+}
+
+
+def vacuum_analyze(conn, table: str):
+    """VACUUM ANALYZE (hors transaction) : statistiques et visibility map à jour,
+    comme après le passage de l'autovacuum, pour les parcours index-only"""
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"VACUUM ANALYZE {table}")
+    finally:
+        conn.autocommit = False
+
+
+def timestamp_indexes(conn, table: str) -> dict:
+    """Index de `table` qui contiennent la colonne `timestamp` (nom -> CREATE
+    INDEX), d'après pg_index ; ceux d'une contrainte (clé primaire, unique)
+    ne sont pas listés, ils ne peuvent pas être supprimés seuls"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT i.relname, pg_get_indexdef(x.indexrelid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_attribute a
+              ON a.attrelid = x.indrelid AND a.attnum = ANY (x.indkey)
+            WHERE x.indrelid = %s::regclass AND a.attname = 'timestamp'
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid
+              )
+            """,
+            (table,),
+        )
+        indexes = dict(cur.fetchall())
+    conn.rollback()
+    return indexes
+
 
-    - `field_mongo` example: 'iss_position.lattitude'
-    - `column_pg` example: 'lattitude'
-    - `filter_value` is used as threshold (we use > filter_value)
+def compare_time_indexes(table: str = "mongo_import"):
+    """Taille des index sur `timestamp` (BRIN, B-tree couvrant) et p50 des
+    requêtes de `TIME_QUERIES`, comparés à la table sans aucun index sur
+    `timestamp` (tous ceux de `timestamp_indexes` sont supprimés).
+
+    Les index sur `timestamp` déjà présents sont recréés à la fin.
     """
     print("\n" + "=" * 70)
-    print(f"TEST INDEX: champ Mongo '{field_mongo}' vs Postgres '{column_pg}'")
+    print(f"INDEX SUR TIMESTAMP: {table}")
     print("=" * 70 + "\n")
 
-    # Prepare filters
-    mongo_filter = (
-        {f"{field_mongo}": {"$gt": filter_value}}
-        if isinstance(filter_value, (int, float))
-        else {field_mongo: filter_value}
-    )
-    pg_query = f"SELECT lattitude, longitude, timestamp FROM mongo_import WHERE {column_pg} > %s"
+    conn = connect_supabase()
+    names = {kind: time_index_name(table, kind) for kind in TIME_INDEXES}
+    existing = timestamp_indexes(conn, table)
+    if existing:
+        print(f"Index sur timestamp retirés pendant le test: {', '.join(existing)}")
+    rows = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT max(timestamp) FROM {table}")
+            end = cur.fetchone()[0]
+        if end is None:
+            raise ValueError(f"{table} ne contient aucun timestamp")
+        end += timedelta(seconds=1)
+
+        for variant in (None,) + tuple(TIME_INDEXES):
+            for name in set(names.values()) | set(existing):
+                drop_postgres_index(conn, name)
+            size = 0
+            if variant is not None:
+                started = time.perf_counter()
+                ensure_time_indexes(conn, table, [variant])
+                build_ms = (time.perf_counter() - started) * 1000
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_relation_size(%s)", (names[variant],))
+                    size = cur.fetchone()[0]
+                conn.rollback()
+                print(
+                    f"-- {variant}: {size / 1024:.0f} Ko, créé en {build_ms:.0f} ms --"
+                )
+            else:
+                print("-- Sans index de temps --")
+            vacuum_analyze(conn, table)
+
+            row = {"Index": variant or "aucun", "Taille (Ko)": f"{size / 1024:.0f}"}
+            for label, (sql, window) in TIME_QUERIES.items():
+                sql = sql.format(table=table)
+                params = (
+                    {"start": end - timedelta(seconds=window), "end": end}
+                    if window
+                    else None
+                )
+                result = run_measured(
+                    lambda: query_supabase_with_explain(
+                        conn, sql, params, explain=False
+                    ),
+                    plan_fn=lambda: explain_supabase(conn, sql, params),
+                )
+                scans = "+".join(result["plan"]["scan_types"])
+                print(f"{label} ({scans}, {result['rows_returned']} lignes):")
+                print_stats(result["stats"])
+                row[f"{label} (ms)"] = f"{result['execution_time_ms']:.2f}"
+            rows.append(row)
+    finally:
+        for name in set(names.values()) | set(existing):
+            drop_postgres_index(conn, name)
+        with conn.cursor() as cur:
+            for definition in existing.values():
+                cur.execute(definition)
+        conn.commit()
+        release_supabase(conn)
 
-    # Connect
-    mclient = connect_mongodb()
-    pconn = connect_supabase()
+    print("\n" + pd.DataFrame(rows).to_string(index=False))
+    return rows
 
-    # Ensure no indexes
+
+# ========== TYPE DE LA CLÉ ==========
+
+
+def compare_id_types(table="mongo_import", mode="insert", batch_size=1000, rounds=4):
+    """Recopier les lignes de `table` dans une table par type de `id` (ID_TYPES),
+    avec le chargeur de l'export (`make_inserter`, `mode` insert ou copy), puis
+    comparer le débit d'insertion, le débit quand toutes les lignes existent
+    déjà (sondes ON CONFLICT seules) et les tailles de `get_supabase_table_stats`.
+
+    Le chargement est refait `rounds` fois en alternant l'ordre des types (le
+    premier chargé paie le cache froid, le suivant hérite des pages et des WAL
+    du précédent) ; les débits affichés sont des médianes.
+    """
+    print("\n" + "=" * 70)
+    print(f"TYPE DE LA CLÉ id: {table} (mode {mode}, {rounds} passages)")
+    print("=" * 70 + "\n")
+
+    conn = connect_supabase()
+    rates = {id_type: {"insert": [], "conflict": []} for id_type in ID_TYPES}
+    stats = {}
     try:
-        # drop default index name if exists
-        drop_mongo_index(mclient, field_mongo + "_1")
-    except Exception:
-        pass
-    drop_postgres_index(pconn, f"idx_mongo_import_{column_pg}")
+        with conn.cursor() as cur:
+            id_hex = ID_TO_HEX[table_id_type(conn, table)].format("id")
+            cur.execute(
+                f"SELECT {id_hex}, message, timestamp, lattitude, longitude "
+                f"FROM {table} ORDER BY 1"
+            )
+            rows = cur.fetchall()
+        conn.rollback()
+        if not rows:
+            raise ValueError(f"{table} est vide")
+
+        for round_ in range(rounds):
+            order = list(ID_TYPES) if round_ % 2 == 0 else list(reversed(ID_TYPES))
+            for id_type in order:
+                target = f"{table}_id_{id_type}"
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP TABLE IF EXISTS {target}")
+                conn.commit()
+                ensure_table(conn, target, id_type=id_type)
+                insert = make_inserter(conn, target, mode)
+                # 1er passage : insertions ; 2e passage : uniquement des conflits
+                for key in ("insert", "conflict"):
+                    started = time.perf_counter()
+                    for batch in chunked(rows, batch_size):
+                        insert(batch)
+                    rates[id_type][key].append(
+                        len(rows) / (time.perf_counter() - started)
+                    )
+                print(
+                    f"passage {round_ + 1}, {id_type}: "
+                    f"{rates[id_type]['insert'][-1]:.0f} lignes/s, "
+                    f"{rates[id_type]['conflict'][-1]:.0f} lignes/s en doublon"
+                )
+                if round_ == rounds - 1:
+                    vacuum_analyze(conn, target)
+                    stats[id_type] = get_supabase_table_stats(conn, target)
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP TABLE {target}")
+                conn.commit()
+    finally:
+        release_supabase(conn)
+
+    summary = []
+    for id_type in ID_TYPES:
+        insert_rate = float(pd.Series(rates[id_type]["insert"]).median())
+        conflict_rate = float(pd.Series(rates[id_type]["conflict"]).median())
+        summary.append(
+            {
+                "Type de id": id_type,
+                "Lignes": stats[id_type]["row_count"],
+                "Insertion (lignes/s)": f"{insert_rate:.0f}",
+                "Doublons (lignes/s)": f"{conflict_rate:.0f}",
+                "Données": stats[id_type]["heap_size"],
+                "Index": stats[id_type]["index_size"],
+                "Total": stats[id_type]["table_size"],
+            }
+        )
+    print("\n" + pd.DataFrame(summary).to_string(index=False))
+    return summary
 
-    # Run tests without index
-    mongo_times = []
-    pg_times = []
-    print("-- Sans index --")
-    for i in range(runs):
-        mr = query_mongodb_with_explain(mclient, mongo_filter)
-        mongo_times.append(mr["execution_time_ms"])
 
-        pr = query_supabase_with_explain(pconn, pg_query, params=(filter_value,))
-        pg_times.append(pr["execution_time_ms"])
+# ========== SCÉNARIOS ==========
 
-    avg_mongo_noidx = sum(mongo_times) / len(mongo_times) if mongo_times else 0
-    avg_pg_noidx = sum(pg_times) / len(pg_times) if pg_times else 0
-    print(f"Mongo sans index (ms): {avg_mongo_noidx:.2f} (avg of {runs})")
-    print(f"Postgres sans index (ms): {avg_pg_noidx:.2f} (avg of {runs})")
+SCENARIOS_FILE = Path(__file__).parent.joinpath("scenarios.yaml")
 
-    # Create indexes
-    print("\n-- Création des index --")
-    idx_name_m = create_mongo_index(mclient, field_mongo, index_name=field_mongo + "_1")
-    create_postgres_index(
-        pconn, "mongo_import", column_pg, f"idx_mongo_import_{column_pg}"
+
+def load_scenarios(path=None, names=None):
+    """Charger les scénarios du fichier YAML (seulement `names` si fourni)"""
+    with open(path or SCENARIOS_FILE, encoding="utf-8") as f:
+        scenarios = yaml.safe_load(f)["scenarios"]
+    if names:
+        scenarios = [scenario for scenario in scenarios if scenario["name"] in names]
+    return scenarios
+
+
+def bind_params(value, params):
+    """Remplacer les "{{nom}}" d'un filtre/pipeline Mongo par les valeurs de `params`"""
+    if isinstance(value, dict):
+        return {key: bind_params(item, params) for key, item in value.items()}
+    if isinstance(value, list):
+        return [bind_params(item, params) for item in value]
+    if isinstance(value, str) and value.startswith("{{") and value.endswith("}}"):
+        return params[value[2:-2].strip()]
+    return value
+
+
+def measure_scenario(scenario, mongo_client, supabase_conn, label=None, cache=None):
+    """Mesurer un scénario sur les deux bases et vérifier le nombre de lignes attendu
+
+    Avec `cache`, les requêtes passent par ce cache ; la table et la collection
+    sont d'abord invalidées : le 1er appel (cold) est un miss, les itérations
+    des hits, et rien n'est repris d'une autre mesure (ex. avant les index).
+    """
+    params = scenario.get("params") or {}
+    mongo = scenario.get("mongo") or {}
+    table = scenario.get("table", "mongo_import")
+    if cache is not None:
+        cache.invalidate(table)
+        cache.invalidate(mongo_source(mongo_client[DB_NAME][COLLECTION_NAME]))
+
+    print("MONGODB - Exécution...")
+    if "pipeline" in mongo:
+        pipeline = bind_params(mongo["pipeline"], params)
+        mongo_result = run_measured(
+            lambda: aggregate_mongodb(mongo_client, pipeline, cache),
+            plan_fn=lambda: explain_mongodb(mongo_client, pipeline=pipeline),
+        )
+    else:
+        query_filter = bind_params(mongo.get("filter") or {}, params)
+        mongo_result = run_measured(
+            lambda: query_mongodb_with_explain(
+                mongo_client, query_filter, explain=False, cache=cache
+            ),
+            plan_fn=lambda: explain_mongodb(mongo_client, query_filter),
+        )
+    print_stats(mongo_result["stats"])
+    print(f"Lignes retournées: {mongo_result['rows_returned']}")
+    print_peak_memory(mongo_result)
+    print(f"Plan:\n{mongo_result['explain_info']}")
+
+    print("\nSUPABASE - Exécution...")
+    supabase_result = run_measured(
+        lambda: query_supabase_with_explain(
+            supabase_conn,
+            scenario["sql"],
+            params=params or None,
+            explain=False,
+            source=table,
+            cache=cache,
+        ),
+        plan_fn=lambda: explain_supabase(supabase_conn, scenario["sql"], params),
     )
-    print(f"Mongo index created: {idx_name_m}")
-
-    # Run tests with index
-    mongo_times = []
-    pg_times = []
-    print("-- Avec index --")
-    for i in range(runs):
-        mr = query_mongodb_with_explain(mclient, mongo_filter)
-        mongo_times.append(mr["execution_time_ms"])
-
-        pr = query_supabase_with_explain(pconn, pg_query, params=(filter_value,))
-        pg_times.append(pr["execution_time_ms"])
-
-    avg_mongo_idx = sum(mongo_times) / len(mongo_times) if mongo_times else 0
-    avg_pg_idx = sum(pg_times) / len(pg_times) if pg_times else 0
-    print(f"Mongo avec index (ms): {avg_mongo_idx:.2f} (avg of {runs})")
-    print(f"Postgres avec index (ms): {avg_pg_idx:.2f} (avg of {runs})")
-
-    # Cleanup: drop indexes
-    drop_mongo_index(mclient, idx_name_m)
-    drop_postgres_index(pconn, f"idx_mongo_import_{column_pg}")
-
-    mclient.close()
-    pconn.close()
-
-    # Return two results so they can be displayed in the comparative summary
-    return [
-        {
-            "test": f"Index effect {field_mongo}/{column_pg} (sans index)",
-            "mongodb": {"execution_time_ms": avg_mongo_noidx, "database": "MongoDB"},
-            "supabase": {
-                "execution_time_ms": avg_pg_noidx,
-                "database": "Supabase (PostgreSQL)",
-            },
-        },
-        {
-            "test": f"Index effect {field_mongo}/{column_pg} (avec index)",
-            "mongodb": {"execution_time_ms": avg_mongo_idx, "database": "MongoDB"},
-            "supabase": {
-                "execution_time_ms": avg_pg_idx,
-                "database": "Supabase (PostgreSQL)",
-            },
-        },
-    ]
+    print_stats(supabase_result["stats"])
+    print(f"Lignes retournées: {supabase_result['rows_returned']}")
+    print_peak_memory(supabase_result)
+    print(f"Plan:\n{supabase_result['explain_info']}")
+
+    expected = scenario.get("expected_rows")
+    if expected is not None:
+        for result in (mongo_result, supabase_result):
+            result["rows_ok"] = result["rows_returned"] == expected
+            if not result["rows_ok"]:
+                print(
+                    f"ATTENTION {result['database']}: {result['rows_returned']} lignes, "
+                    f"{expected} attendues"
+                )
+
+    return {
+        "test": label or scenario["name"],
+        "mongodb": mongo_result,
+        "supabase": supabase_result,
+    }
+
+
+def run_scenario(scenario, mongo_client, supabase_conn):
+    """Exécuter un scénario ; avec `indexes`, le mesurer sans puis avec les index
+
+    Avec CACHE, chaque mesure est suivie de la même à travers le cache, sous
+    le nom "<test> (cache)" ; les mesures sans ce suffixe ne lisent jamais le
+    cache (comparables à un run de référence sans --cache).
+    """
+    print("\n" + "=" * 70)
+    print(f"SCÉNARIO: {scenario['name']}")
+    if scenario.get("description"):
+        print(scenario["description"])
+    print("=" * 70 + "\n")
+
+    def measure(label):
+        measured = [measure_scenario(scenario, mongo_client, supabase_conn, label)]
+        if CACHE is not None:
+            print("\n-- Avec cache --")
+            measured.append(
+                measure_scenario(
+                    scenario, mongo_client, supabase_conn, f"{label} (cache)", CACHE
+                )
+            )
+        return measured
+
+    indexes = scenario.get("indexes")
+    if not indexes:
+        return measure(scenario["name"])
+
+    table = scenario.get("table", "mongo_import")
+    # "champ" = index ascendant, {champ: type} = index d'un autre type (2dsphere, gist...)
+    mongo_indexes = {}
+    for spec in indexes.get("mongo", []):
+        field, index_type = (
+            next(iter(spec.items())) if isinstance(spec, dict) else (spec, 1)
+        )
+        mongo_indexes[f"{field}_{index_type}"] = (field, index_type)
+    pg_indexes = {}
+    for spec in indexes.get("postgres", []):
+        column, using = (
+            next(iter(spec.items())) if isinstance(spec, dict) else (spec, None)
+        )
+        index_name = f"idx_{table}_{re.sub(r'[^0-9a-zA-Z]+', '_', column)}"
+        pg_indexes[index_name + (f"_{using}" if using else "")] = (column, using)
 
+    # Index déjà présents avant le scénario : recréés et conservés à la fin
+    existing = {
+        name for name in mongo_indexes if mongo_index_exists(mongo_client, name)
+    } | {name for name in pg_indexes if postgres_index_exists(supabase_conn, name)}
 
-# ========== MAIN ==========
+    # Ensure no indexes
+    for index_name in mongo_indexes:
+        drop_mongo_index(mongo_client, index_name)
+    for index_name in pg_indexes:
+        drop_postgres_index(supabase_conn, index_name)
 
-if __name__ == "__main__":
-    try:
-        print("\nBENCHMARK - MONGODB vs SUPABASE")
-        print("=" * 70)
+    print("-- Sans index --")
+    without_index = measure(f"{scenario['name']} (sans index)")
 
-        # Afficher les stats
-        display_stats()
+    print("\n-- Création des index --")
+    for index_name, (field, index_type) in mongo_indexes.items():
+        create_mongo_index(mongo_client, field, index_name, index_type)
+    for index_name, (column, using) in pg_indexes.items():
+        create_postgres_index(supabase_conn, table, column, index_name, using)
 
-        # Exécuter les tests
+    try:
+        print("-- Avec index --")
+        with_index = measure(f"{scenario['name']} (avec index)")
+    finally:
+        # Cleanup: drop the indexes created by the scenario
+        for index_name in mongo_indexes.keys() - existing:
+            drop_mongo_index(mongo_client, index_name)
+        for index_name in pg_indexes.keys() - existing:
+            drop_postgres_index(supabase_conn, index_name)
+
+    print_plan_diffs(without_index[0], with_index[0])
+    return without_index + with_index
+
+
+def run_scenarios(scenarios):
+    """Exécuter tous les scénarios avec une seule connexion par base"""
+    mongo_client = connect_mongodb()
+    supabase_conn = connect_supabase()
+    try:
         results = []
+        for scenario in scenarios:
+            results.extend(run_scenario(scenario, mongo_client, supabase_conn))
+        return results
+    finally:
+        release_supabase(supabase_conn)
 
-        # Test 1: SELECT simple
-        results.append(compare_simple_select())
 
-        # Test 2: SELECT avec filtre
-        results.append(compare_filtered_query())
+# ========== MAIN ==========
 
-        # Test 3: Agrégation
-        results.append(compare_aggregation())
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark MongoDB vs Supabase")
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Appels non mesurés avant les itérations"
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=10, help="Itérations mesurées par requête"
+    )
+    parser.add_argument(
+        "--drop-caches-cmd",
+        default=None,
+        help="Commande shell qui vide les caches (ex: 'docker restart postgres_perf')",
+    )
+    parser.add_argument(
+        "--cold-runs",
+        action="store_true",
+        help="Exécuter --drop-caches-cmd avant chaque itération (mesures à froid)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Lire les résultats en streaming (curseur serveur / lots) au lieu de tout charger",
+    )
+    parser.add_argument(
+        "--stream-batch-size",
+        type=int,
+        default=2000,
+        help="Taille des lots en streaming (itersize / batch_size)",
+    )
+    parser.add_argument(
+        "--scenarios",
+        default=None,
+        help="Fichier YAML des scénarios (scenarios.yaml par défaut)",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        default=None,
+        help="Nom d'un scénario à exécuter (répétable)",
+    )
+    parser.add_argument(
+        "--output", default=None, help="Fichier de résultats (.json ou .csv)"
+    )
+    parser.add_argument(
+        "--baseline", default=None, help="Résultats d'un run précédent à comparer"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Écart relatif du p50 considéré comme une régression",
+    )
+    parser.add_argument(
+        "--time-indexes",
+        action="store_true",
+        help="Comparer taille et latence des index sur timestamp (BRIN, couvrant) "
+        "au lieu des scénarios",
+    )
+    parser.add_argument(
+        "--id-types",
+        choices=("insert", "copy"),
+        default=None,
+        help="Comparer tailles et débit d'insertion de id TEXT / bytea (chargeur "
+        "insert ou copy) au lieu des scénarios",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Mesurer aussi chaque scénario à travers le cache de résultats "
+        "(query_cache.py, réglages QUERY_CACHE_*, tests « (cache) ») et "
+        "afficher hits / misses",
+    )
+    args = parser.parse_args()
+    BENCH = BenchConfig(
+        warmup=args.warmup,
+        iterations=args.iterations,
+        drop_caches_cmd=args.drop_caches_cmd,
+        cold_runs=args.cold_runs,
+    )
+    STREAM_BATCH_SIZE = args.stream_batch_size if args.stream else 0
+    CACHE = get_cache() if args.cache else None
 
-        # Test 4: Index effect (lattitude > 0)
-        idx_results = compare_index_effect(
-            "iss_position.lattitude", "lattitude", 0, runs=3
-        )
-        if isinstance(idx_results, list):
-            results.extend(idx_results)
+    try:
+        if args.time_indexes:
+            compare_time_indexes()
+        elif args.id_types:
+            compare_id_types(mode=args.id_types)
         else:
-            results.append(idx_results)
+            print("\nBENCHMARK - MONGODB vs SUPABASE")
+            print("=" * 70)
 
-        # Afficher le résumé
-        display_summary(results)
+            # Afficher les stats
+            display_stats()
+
+            # Exécuter les scénarios du registre
+            results = run_scenarios(load_scenarios(args.scenarios, args.only))
+
+            # Afficher le résumé
+            baseline = load_results(args.baseline) if args.baseline else None
+            display_summary(results, baseline=baseline, threshold=args.threshold)
+
+            if args.output:
+                save_results(flatten_results(results), args.output)
+                print(f"\nRésultats enregistrés dans {args.output}")
+
+        if CACHE is not None:
+            stats = CACHE.stats()
+            print(
+                f"\nCache: {stats['hits']} hits mémoire, {stats['disk_hits']} hits "
+                f"disque, {stats['misses']} misses (taux {stats['hit_ratio']:.0%}), "
+                f"{stats['too_large']} résultats trop gros, {stats['stale']} périmés"
+            )
 
         print("\nTests terminés!")
 
     except Exception as e:
         print(f"\nErreur générale: {e}")
+    finally:
+        close_all()
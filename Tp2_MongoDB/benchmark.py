@@ -0,0 +1,297 @@
+"""Benchmark harness: repeated timed runs, summary statistics and run comparison.
+
+Timings use `time.perf_counter_ns`. A run records one cold sample (first call,
+after an optional cache drop), then `warmup` untimed calls, then `iterations`
+timed calls. Results can be saved as JSON or CSV and compared with a previous
+run (e.g. from another commit) to flag regressions.
+"""
+
+import csv
+import json
+import math
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# two-sided 95% Student t critical values by degrees of freedom
+_T95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365,
+    8: 2.306, 9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145,
+    15: 2.131, 16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086,
+    21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980,
+}  # fmt: skip
+
+
+@dataclass
+class BenchConfig:
+    warmup: int = 1
+    iterations: int = 10
+    # shell command run before the cold sample and, with `cold_runs`, before
+    # every iteration (e.g. "docker restart postgres_perf")
+    drop_caches_cmd: str | None = None
+    cold_runs: bool = False
+
+
+def _t_critical(df: int) -> float:
+    if df <= 0:
+        return math.nan
+    if df > max(_T95):
+        return 1.960
+    # untabulated df: the lower tabulated one (larger, conservative value)
+    return _T95[max(key for key in _T95 if key <= df)]
+
+
+def drop_caches(cmd: str | None) -> None:
+    if cmd:
+        subprocess.run(cmd, shell=True, check=True)
+
+
+def timed(fn):
+    """Wrap an untimed callable so it returns its duration in ms."""
+
+    def run():
+        start = time.perf_counter_ns()
+        fn()
+        return (time.perf_counter_ns() - start) / 1e6
+
+    return run
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    """Mean, std, p50/p95/p99, 95% confidence interval and Tukey outliers."""
+    data = np.asarray(samples_ms, dtype=float)
+    n = len(data)
+    if n == 0:
+        return {"count": 0}
+    mean = float(data.mean())
+    std = float(data.std(ddof=1)) if n > 1 else 0.0
+    half_width = _t_critical(n - 1) * std / math.sqrt(n) if n > 1 else math.nan
+    q1, q3 = np.percentile(data, [25, 75])
+    iqr = q3 - q1
+    outliers = data[(data < q1 - 1.5 * iqr) | (data > q3 + 1.5 * iqr)]
+    return {
+        "count": n,
+        "mean_ms": mean,
+        "std_ms": std,
+        "min_ms": float(data.min()),
+        "max_ms": float(data.max()),
+        "p50_ms": float(np.percentile(data, 50)),
+        "p95_ms": float(np.percentile(data, 95)),
+        "p99_ms": float(np.percentile(data, 99)),
+        "ci95_low_ms": mean - half_width,
+        "ci95_high_ms": mean + half_width,
+        "outliers": len(outliers),
+    }
+
+
+def run_benchmark(fn, config: BenchConfig | None = None) -> dict:
+    """Run `fn` (returning its own duration in ms) according to `config`.
+
+    Returns the `summarize` stats of the timed iterations plus `cold_ms`, the
+    first call, and `samples_ms`.
+    """
+    config = config or BenchConfig()
+    drop_caches(config.drop_caches_cmd)
+    cold = fn()
+    for _ in range(config.warmup):
+        fn()
+    samples = []
+    for _ in range(config.iterations):
+        if config.cold_runs:
+            drop_caches(config.drop_caches_cmd)
+        samples.append(fn())
+    stats = summarize(samples)
+    stats["cold_ms"] = cold
+    stats["samples_ms"] = samples
+    return stats
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram with bounded memory.
+
+    Values are recorded in microseconds into power-of-two ranges, each split
+    into `2**sub_bucket_bits` linear sub-buckets, so any percentile is exact
+    to within 1 / 2**sub_bucket_bits relative error (< 1% by default) however
+    many samples are recorded. Histograms from several threads can be merged.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = Counter()
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def _bucket(self, value_us: int) -> int:
+        shift = max(0, value_us.bit_length() - self.sub_bucket_bits)
+        return (value_us >> shift) << shift
+
+    def _bucket_high(self, bucket: int) -> int:
+        shift = max(0, bucket.bit_length() - self.sub_bucket_bits)
+        return bucket + (1 << shift) - 1
+
+    def record(self, value_ms: float) -> None:
+        value_us = max(0, round(value_ms * 1000))
+        self.counts[self._bucket(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, p: float) -> float:
+        """Value in ms at or below which `p` percent of the samples fall."""
+        if not self.count:
+            return math.nan
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._bucket_high(bucket), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total_us / self.count / 1000,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max_us / 1000,
+        }
+
+
+# ========== RESULTS ==========
+
+RESULT_FIELDS = [
+    "test",
+    "database",
+    "count",
+    "mean_ms",
+    "std_ms",
+    "min_ms",
+    "max_ms",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "ci95_low_ms",
+    "ci95_high_ms",
+    "outliers",
+    "cold_ms",
+    "commit",
+    "timestamp",
+]
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        )
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def flatten_results(results_list: list[dict]) -> list[dict]:
+    """One row per (test, database) from the comparison results of Test_perf."""
+    commit = git_commit()
+    stamp = datetime.now().isoformat(timespec="seconds")
+    rows = []
+    for result in results_list:
+        for key in ("mongodb", "supabase"):
+            side = result[key]
+            stats = side.get("stats") or {
+                "count": 1,
+                "p50_ms": side["execution_time_ms"],
+                "mean_ms": side["execution_time_ms"],
+            }
+            row = {field: stats.get(field) for field in RESULT_FIELDS}
+            row.update(
+                test=result["test"],
+                database=side["database"],
+                commit=commit,
+                timestamp=stamp,
+            )
+            rows.append(row)
+    return rows
+
+
+def save_results(rows: list[dict], path: str) -> None:
+    """Write result rows as CSV if `path` ends with .csv, JSON otherwise."""
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+
+
+def load_results(path: str) -> list[dict]:
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            for field in RESULT_FIELDS:
+                if field.endswith("_ms") and row.get(field) not in (None, ""):
+                    row[field] = float(row[field])
+        return rows
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_runs(
+    current: list[dict], baseline: list[dict], threshold: float = 0.10
+) -> list[dict]:
+    """Compare p50 per (test, database) against a baseline run.
+
+    A regression is a p50 more than `threshold` (relative) slower whose 95%
+    confidence interval does not overlap the baseline one (when both have one).
+    """
+    base = {(row["test"], row["database"]): row for row in baseline}
+    comparison = []
+    for row in current:
+        old = base.get((row["test"], row["database"]))
+        if not old or not old.get("p50_ms"):
+            continue
+        delta = (row["p50_ms"] - old["p50_ms"]) / old["p50_ms"]
+        overlap = _intervals_overlap(row, old)
+        comparison.append(
+            {
+                "test": row["test"],
+                "database": row["database"],
+                "baseline_p50_ms": old["p50_ms"],
+                "p50_ms": row["p50_ms"],
+                "delta": delta,
+                "baseline_commit": old.get("commit"),
+                "regression": delta > threshold and not overlap,
+            }
+        )
+    return comparison
+
+
+def _intervals_overlap(a: dict, b: dict) -> bool:
+    bounds = [a.get("ci95_low_ms"), a.get("ci95_high_ms")]
+    bounds += [b.get("ci95_low_ms"), b.get("ci95_high_ms")]
+    if any(v is None or v == "" or math.isnan(float(v)) for v in bounds):
+        return False
+    a_low, a_high, b_low, b_high = (float(v) for v in bounds)
+    return a_low <= b_high and b_low <= a_high
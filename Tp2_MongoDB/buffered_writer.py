@@ -0,0 +1,165 @@
+import threading
+import time
+
+import bson
+from pymongo import WriteConcern
+from pymongo.errors import AutoReconnect, BulkWriteError, PyMongoError
+
+from query_cache import invalidate, mongo_source
+
+DUPLICATE_KEY = 11000
+
+
+def is_transient(error: PyMongoError) -> bool:
+    """Network / failover errors worth retrying (AutoReconnect covers NetworkTimeout)."""
+    return isinstance(error, AutoReconnect) or error.has_error_label(
+        "RetryableWriteError"
+    )
+
+
+def parse_write_concern(value: str | None) -> WriteConcern | None:
+    """Build a `WriteConcern` from a CLI value such as `1`, `0` or `majority`."""
+    if not value:
+        return None
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class BufferedMongoWriter:
+    """Buffer documents and write them with `insert_many(ordered=False)`.
+
+    The buffer is flushed as soon as one limit is reached: `max_items`
+    documents, `max_bytes` of BSON, or `max_age` seconds since the oldest
+    buffered document. Used as a context manager, a background thread enforces
+    `max_age` even when no new document arrives, and the rest is flushed on exit.
+
+    Transient failures (`is_transient`) are retried up to `retries` times; on
+    a partial failure only the documents that were not written are retried.
+    Other errors (validation, ...) are deterministic and not retried. Duplicate
+    keys are counted apart in `duplicates` (e.g. a document written by an
+    attempt whose acknowledgement was lost), neither inserted nor failed.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_items: int | None = 100,
+        max_bytes: int = 4 * 1024 * 1024,
+        max_age: float = 10.0,
+        write_concern: WriteConcern | None = None,
+        retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        if retries < 0:
+            raise ValueError(f"retries must be >= 0, got {retries}")
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+        self.collection = collection
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+
+        self._buffer = []
+        self._bytes = 0
+        self._oldest = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._timer = None
+
+    def __enter__(self):
+        if self.max_age and self._timer is None:
+            self._timer = threading.Thread(target=self._age_loop, daemon=True)
+            self._timer.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, data) -> None:
+        """Buffer one document or a list of documents, flushing if a limit is hit."""
+        docs = data if isinstance(data, list) else [data]
+        with self._lock:
+            for doc in docs:
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                self._buffer.append(doc)
+                self._bytes += len(bson.encode(doc))
+            if self._is_due():
+                self.flush()
+
+    def _is_due(self) -> bool:
+        if not self._buffer:
+            return False
+        if self.max_items and len(self._buffer) >= self.max_items:
+            return True
+        if self._bytes >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.monotonic() - self._oldest >= self.max_age
+
+    def _age_loop(self):
+        interval = min(self.max_age, 1.0)
+        while not self._stop.wait(interval):
+            with self._lock:
+                if self._is_due():
+                    self.flush()
+
+    def flush(self) -> int:
+        """Write the buffered documents now. Returns how many were written."""
+        with self._lock:
+            docs, self._buffer = self._buffer, []
+            self._bytes = 0
+            self._oldest = None
+            if not docs:
+                return 0
+            written, duplicates = self._insert_with_retry(docs)
+            if written:
+                invalidate(mongo_source(self.collection))
+            self.inserted += written
+            self.duplicates += duplicates
+            self.failed += len(docs) - written - duplicates
+            print(
+                f"Flushed batch insert ({written}/{len(docs)} docs, "
+                f"{duplicates} duplicates)"
+            )
+            return written
+
+    def _insert_with_retry(self, docs: list) -> tuple[int, int]:
+        """Insert `docs`, retrying transient errors; return (written, duplicates)."""
+        written = duplicates = 0
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                res = self.collection.insert_many(docs, ordered=False)
+                return written + len(res.inserted_ids), duplicates
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                written += e.details.get("nInserted", len(docs) - len(errors))
+                duplicates += sum(err.get("code") == DUPLICATE_KEY for err in errors)
+                failed = {
+                    err["index"] for err in errors if err.get("code") != DUPLICATE_KEY
+                }
+                error = e if failed else None
+                if not failed or not is_transient(e):
+                    break
+                docs = [doc for i, doc in enumerate(docs) if i in failed]
+            except PyMongoError as e:
+                error = e
+                if not is_transient(e):
+                    break
+            if attempt < self.retries:
+                time.sleep(self.retry_backoff * 2**attempt)
+        if error is not None:
+            print(f"Batch insert failed after {attempt + 1} attempt(s): {error}")
+        return written, duplicates
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
@@ -1,20 +1,33 @@
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from psycopg2.pool import ThreadedConnectionPool
+
+# Shared connections: one MongoClient per URL and one Postgres pool per DSN,
+# created on first use and reused by every script of the process.
+_default_env_loaded = False
+_mongo_clients: dict = {}
+_pg_pools: dict = {}
+_lock = threading.Lock()
 
 
 def load_env(env_path: str | None = None) -> dict:
     """Load environment variables from a `.env` file (if present) and return keys.
 
-    Looks for a `.env` next to this file by default.
+    Looks for a `.env` next to this file by default; that default file is only
+    read once per process.
     """
+    global _default_env_loaded
     if env_path:
         load_dotenv(env_path)
-    else:
+    elif not _default_env_loaded:
         env_file = Path(__file__).parent.joinpath(".env")
         if env_file.exists():
             load_dotenv(env_file)
+        _default_env_loaded = True
 
     return {
         "MONGO_URL": os.getenv("MONGO_URL", "").strip(),
@@ -24,9 +37,12 @@ def load_env(env_path: str | None = None) -> dict:
 
 
 def get_mongo_client(mongo_url: str | None = None, **kwargs) -> MongoClient:
-    """Return a configured `pymongo.MongoClient`.
+    """Return the shared `pymongo.MongoClient` for `mongo_url`.
 
     If `mongo_url` is not provided, reads `MONGO_URL` from the environment or `.env`.
+    The client (and its connection pool) is created once per URL and options;
+    pool size and timeouts default to `MONGO_MAX_POOL_SIZE` and
+    `MONGO_SERVER_SELECTION_TIMEOUT_MS`. Do not `close()` it, use `close_all()`.
     """
     if not mongo_url:
         env = load_env()
@@ -37,7 +53,85 @@ def get_mongo_client(mongo_url: str | None = None, **kwargs) -> MongoClient:
             "MONGO_URL is not set. Put it in the .env file or set the environment variable."
         )
 
-    return MongoClient(mongo_url, **kwargs)
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "serverSelectionTimeoutMS": int(
+            os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")
+        ),
+        **kwargs,
+    }
+    key = (mongo_url, tuple(sorted(options.items())))
+    with _lock:
+        client = _mongo_clients.get(key)
+        if client is None:
+            client = _mongo_clients[key] = MongoClient(mongo_url, **options)
+    return client
+
+
+def get_postgres_url(pg_url: str | None = None) -> str:
+    """Return the Postgres URL: argument, then POSTGRES_URL, SUPABASE_DB_URL, SUPABASE_URL."""
+    if not pg_url:
+        load_env()
+        pg_url = (
+            os.getenv("POSTGRES_URL")
+            or os.getenv("SUPABASE_DB_URL")
+            or os.getenv("SUPABASE_URL")
+        )
+    if not pg_url:
+        raise ValueError(
+            "POSTGRES_URL is not set. Put it in the .env file or set the environment variable."
+        )
+    return pg_url
+
+
+def get_pg_pool(pg_url: str | None = None) -> ThreadedConnectionPool:
+    """Return the shared `ThreadedConnectionPool` for `pg_url`.
+
+    Sizes and timeout come from `PG_POOL_MIN`, `PG_POOL_MAX` and
+    `PG_CONNECT_TIMEOUT` (seconds).
+    """
+    pg_url = get_postgres_url(pg_url)
+    with _lock:
+        pool = _pg_pools.get(pg_url)
+        if pool is None:
+            pool = _pg_pools[pg_url] = ThreadedConnectionPool(
+                int(os.getenv("PG_POOL_MIN", "1")),
+                int(os.getenv("PG_POOL_MAX", "10")),
+                dsn=pg_url,
+                connect_timeout=int(os.getenv("PG_CONNECT_TIMEOUT", "10")),
+            )
+    return pool
+
+
+def get_pg_connection(pg_url: str | None = None):
+    """Borrow a connection from the pool; give it back with `release_pg_connection`."""
+    return get_pg_pool(pg_url).getconn()
+
+
+def release_pg_connection(conn, pg_url: str | None = None) -> None:
+    get_pg_pool(pg_url).putconn(conn)
+
+
+@contextmanager
+def pg_connection(pg_url: str | None = None):
+    """`with pg_connection() as conn:` borrows a pooled connection for the block."""
+    pool = get_pg_pool(pg_url)
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def close_all() -> None:
+    """Close every shared Mongo client and Postgres pool (end of script / worker)."""
+    with _lock:
+        for client in _mongo_clients.values():
+            client.close()
+        for pool in _pg_pools.values():
+            pool.closeall()
+        _mongo_clients.clear()
+        _pg_pools.clear()
 
 
 def get_database(client: MongoClient | None = None, db_name: str | None = None):
@@ -0,0 +1,442 @@
+"""Time-bucketed rollups of the ISS track, in MongoDB and Postgres.
+
+Every level keeps, per bucket: the first and last sample (time and
+position), the average position and the number of samples. Levels are
+built in cascade: 1 min buckets from the raw samples, 1 h from the 1 min
+buckets and 1 day from the 1 h buckets (averages weighted by the sample
+counts), so a refresh only reads recent data:
+
+- MongoDB: one collection per level, `<collection>_1min`, `_1h`, `_1d`,
+  with `_id` = bucket start in epoch seconds (like the raw `timestamp`),
+  written with `$merge`;
+- Postgres: tables `<table>_1min`, `_1h`, `_1d` keyed by the bucket start
+  in UTC, written with `INSERT ... ON CONFLICT DO UPDATE`. The exporter
+  writes local times (`datetime.fromtimestamp`): they are converted from
+  `timezone` (the zone the exporter ran in, by default this machine's) to
+  UTC before `date_bin`, so buckets, days included, match the MongoDB ones.
+  `first_ts` / `last_ts` stay local times, like the raw column. The hour
+  repeated when DST ends is ambiguous in local time: its samples all land in
+  one of the two UTC hours.
+
+A refresh recomputes, for each level, the buckets from its last stored
+bucket onward (that one is usually partial). Samples older than the last
+bucket of a level (late inserts) need `--full`. The average longitude is a
+plain mean: across the antimeridian (once per orbit) it is not a position on
+the track, the first/last points are.
+
+`pick_level` / `query_track` answer "track between `start` and `end`, one
+point per `resolution` seconds" from the coarsest level that is still fine
+enough, and read the raw samples only below 1 min.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING
+
+from connexion import (
+    close_all,
+    get_collection,
+    get_pg_connection,
+    load_env,
+    release_pg_connection,
+)
+from geo import LATITUDE, LONGITUDE
+from import_donnes_mogo_to_postgres import ensure_time_indexes
+
+# level -> bucket size in seconds, finest first
+LEVELS = {"1min": 60, "1h": 3600, "1d": 86400}
+BUCKET_FIELDS = [
+    "first_ts",
+    "first_lat",
+    "first_lon",
+    "last_ts",
+    "last_lat",
+    "last_lon",
+    "avg_lat",
+    "avg_lon",
+    "count",
+]
+
+
+def pick_level(start: datetime, end: datetime, resolution: float) -> str | None:
+    """Coarsest level with buckets <= `resolution` and <= the range; None = raw."""
+    span = (end - start).total_seconds()
+    chosen = None
+    for level, seconds in LEVELS.items():
+        if seconds <= resolution and seconds <= span:
+            chosen = level
+    return chosen
+
+
+def local_timezone() -> str:
+    """IANA name of this machine's zone (`TZ`, else /etc/localtime), or UTC."""
+    name = os.getenv("TZ", "").lstrip(":")
+    if name:
+        return name
+    path = os.path.realpath("/etc/localtime")
+    if "zoneinfo/" in path:
+        return path.split("zoneinfo/", 1)[1]
+    return "UTC"
+
+
+def _to_utc(local: datetime) -> datetime:
+    """Naive local time of this process -> naive UTC."""
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _source_level(level: str) -> str | None:
+    """Level a level is built from (None = raw samples)."""
+    levels = list(LEVELS)
+    index = levels.index(level)
+    return levels[index - 1] if index else None
+
+
+# ========== MONGODB ==========
+
+
+def _mongo_raw_stage(start: int | None) -> list[dict]:
+    """Raw samples shaped as one-sample buckets (`t` = sample time)."""
+    match = {"timestamp": {"$type": "number"}, "iss_position": {"$exists": True}}
+    if start is not None:
+        match["timestamp"]["$gte"] = start
+    return [
+        {"$match": match},
+        {
+            "$project": {
+                "t": "$timestamp",
+                "first_ts": "$timestamp",
+                "first_lat": LATITUDE,
+                "first_lon": LONGITUDE,
+                "last_ts": "$timestamp",
+                "last_lat": LATITUDE,
+                "last_lon": LONGITUDE,
+                "avg_lat": LATITUDE,
+                "avg_lon": LONGITUDE,
+                "count": {"$literal": 1},
+            }
+        },
+    ]
+
+
+def mongo_rollup_pipeline(
+    seconds: int, into: str, start: int | None, from_raw: bool
+) -> list[dict]:
+    if from_raw:
+        pipeline = _mongo_raw_stage(start)
+    else:
+        pipeline = [{"$match": {"_id": {"$gte": start}}}] if start is not None else []
+        pipeline.append({"$set": {"t": "$_id"}})
+    pipeline += [
+        {"$sort": {"t": 1}},
+        {
+            "$group": {
+                "_id": {"$subtract": ["$t", {"$mod": ["$t", seconds]}]},
+                "first_ts": {"$first": "$first_ts"},
+                "first_lat": {"$first": "$first_lat"},
+                "first_lon": {"$first": "$first_lon"},
+                "last_ts": {"$last": "$last_ts"},
+                "last_lat": {"$last": "$last_lat"},
+                "last_lon": {"$last": "$last_lon"},
+                "lat_sum": {"$sum": {"$multiply": ["$avg_lat", "$count"]}},
+                "lon_sum": {"$sum": {"$multiply": ["$avg_lon", "$count"]}},
+                "count": {"$sum": "$count"},
+            }
+        },
+        {
+            "$set": {
+                "avg_lat": {"$divide": ["$lat_sum", "$count"]},
+                "avg_lon": {"$divide": ["$lon_sum", "$count"]},
+            }
+        },
+        {"$unset": ["lat_sum", "lon_sum"]},
+        {"$merge": {"into": into, "on": "_id", "whenMatched": "replace"}},
+    ]
+    return pipeline
+
+
+def mongo_bucket_collection(raw, level: str):
+    return raw.database[f"{raw.name}_{level}"]
+
+
+def refresh_mongo(raw, full: bool = False) -> dict:
+    """Refresh every level from its last bucket (everything with `full`)."""
+    raw.create_index([("timestamp", ASCENDING)])
+    timings = {}
+    for level, seconds in LEVELS.items():
+        target = mongo_bucket_collection(raw, level)
+        source_level = _source_level(level)
+        source = (
+            raw if source_level is None else mongo_bucket_collection(raw, source_level)
+        )
+        start = None
+        if full:
+            target.delete_many({})
+        else:
+            last = target.find_one(sort=[("_id", -1)], projection={"_id": 1})
+            start = last["_id"] if last else None
+        started = time.perf_counter()
+        source.aggregate(
+            mongo_rollup_pipeline(seconds, target.name, start, source_level is None),
+            allowDiskUse=True,
+        )
+        timings[level] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def query_track_mongo(raw, start: datetime, end: datetime, resolution: float):
+    """(level, buckets) of the track between `start` and `end` (local times)."""
+    level = pick_level(start, end, resolution)
+    lo, hi = int(start.timestamp()), int(end.timestamp())
+    if level is None:
+        rows = raw.aggregate(
+            _mongo_raw_stage(lo) + [{"$match": {"t": {"$lt": hi}}}, {"$sort": {"t": 1}}]
+        )
+        return "raw", [dict(row, bucket=row["t"]) for row in rows]
+    seconds = LEVELS[level]
+    target = mongo_bucket_collection(raw, level)
+    rows = target.find({"_id": {"$gte": lo - lo % seconds, "$lt": hi}}).sort("_id", 1)
+    return level, [dict(row, bucket=row["_id"]) for row in rows]
+
+
+# ========== POSTGRES ==========
+
+
+def ensure_pg_levels(conn, table: str) -> None:
+    with conn.cursor() as cur:
+        for level in LEVELS:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table}_{level} (
+                    bucket TIMESTAMP PRIMARY KEY,
+                    first_ts TIMESTAMP NOT NULL,
+                    first_lat FLOAT NOT NULL,
+                    first_lon FLOAT NOT NULL,
+                    last_ts TIMESTAMP NOT NULL,
+                    last_lat FLOAT NOT NULL,
+                    last_lon FLOAT NOT NULL,
+                    avg_lat FLOAT NOT NULL,
+                    avg_lon FLOAT NOT NULL,
+                    count BIGINT NOT NULL
+                )
+                """)
+    conn.commit()
+    # the refresh reads the raw samples from a point in time onward
+    ensure_time_indexes(conn, table, ["brin"])
+
+
+def _pg_source(
+    table: str, level: str, start: datetime | None, tz: str
+) -> tuple[str, list]:
+    """SELECT returning one-row-per-sample or finer buckets as (t, BUCKET_FIELDS).
+
+    `t` and `start` are UTC; the raw `timestamp` column is local time in `tz`.
+    """
+    source_level = _source_level(level)
+    params = [tz]
+    if source_level is None:
+        sql = (
+            "SELECT timestamp AT TIME ZONE %s AT TIME ZONE 'UTC' AS t, "
+            "timestamp AS first_ts, lattitude AS first_lat, "
+            "longitude AS first_lon, timestamp AS last_ts, lattitude AS last_lat, "
+            "longitude AS last_lon, lattitude AS avg_lat, longitude AS avg_lon, "
+            f"1 AS count FROM {table} WHERE timestamp IS NOT NULL"
+        )
+        if start is not None:
+            sql += " AND timestamp >= %s::timestamp AT TIME ZONE 'UTC' AT TIME ZONE %s"
+            params += [start, tz]
+    else:
+        sql = f"SELECT bucket AS t, * FROM {table}_{source_level}"
+        params = []
+        if start is not None:
+            sql += " WHERE bucket >= %s"
+            params.append(start)
+    return sql, params
+
+
+def refresh_postgres(
+    conn, table: str, full: bool = False, tz: str | None = None
+) -> dict:
+    """Refresh every level from its last bucket (everything with `full`).
+
+    `tz`: zone of the raw local timestamps (default: `local_timezone()`).
+    """
+    tz = tz or local_timezone()
+    ensure_pg_levels(conn, table)
+    timings = {}
+    for level, seconds in LEVELS.items():
+        target = f"{table}_{level}"
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            start = None
+            if full:
+                cur.execute(f"TRUNCATE {target}")
+            else:
+                cur.execute(f"SELECT max(bucket) FROM {target}")
+                start = cur.fetchone()[0]
+            source, params = _pg_source(table, level, start, tz)
+            updates = ", ".join(
+                f"{field} = excluded.{field}" for field in BUCKET_FIELDS
+            )
+            cur.execute(
+                f"""
+                INSERT INTO {target}
+                SELECT date_bin(%s, t, TIMESTAMP '2000-01-01') AS bucket,
+                       (array_agg(first_ts ORDER BY t))[1],
+                       (array_agg(first_lat ORDER BY t))[1],
+                       (array_agg(first_lon ORDER BY t))[1],
+                       (array_agg(last_ts ORDER BY t DESC))[1],
+                       (array_agg(last_lat ORDER BY t DESC))[1],
+                       (array_agg(last_lon ORDER BY t DESC))[1],
+                       sum(avg_lat * count) / sum(count),
+                       sum(avg_lon * count) / sum(count),
+                       sum(count)
+                FROM ({source}) AS s
+                GROUP BY 1
+                ON CONFLICT (bucket) DO UPDATE SET {updates}
+                """,
+                [timedelta(seconds=seconds)] + params,
+            )
+        conn.commit()
+        timings[level] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def query_track_postgres(
+    conn,
+    table: str,
+    start: datetime,
+    end: datetime,
+    resolution: float,
+    tz: str | None = None,
+):
+    """(level, buckets) of the track between `start` and `end` (local times).
+
+    `bucket` is the UTC bucket start (the UTC sample time for raw samples).
+    """
+    tz = tz or local_timezone()
+    level = pick_level(start, end, resolution)
+    start, end = _to_utc(start), _to_utc(end)
+    with conn.cursor() as cur:
+        if level is None:
+            source, params = _pg_source(table, "1min", start, tz)
+            cur.execute(
+                f"{source} AND timestamp < %s::timestamp AT TIME ZONE 'UTC' "
+                "AT TIME ZONE %s ORDER BY t",
+                params + [end, tz],
+            )
+            level = "raw"
+        else:
+            cur.execute(
+                f"SELECT bucket, {', '.join(BUCKET_FIELDS)} FROM {table}_{level} "
+                "WHERE bucket >= date_bin(%s, %s, TIMESTAMP '2000-01-01') "
+                "AND bucket < %s ORDER BY bucket",
+                (timedelta(seconds=LEVELS[level]), start, end),
+            )
+        columns = ["bucket"] + BUCKET_FIELDS
+        rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+    conn.rollback()
+    return level, rows
+
+
+# ========== CLI ==========
+
+
+def parse_duration(text: str) -> float:
+    """'90', '90s', '15m', '6h', '7d' -> seconds."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Downsample the ISS track into 1min / 1h / 1d buckets"
+    )
+    parser.add_argument("--env", default=None, help="Path to .env file")
+    parser.add_argument(
+        "--backend",
+        choices=["mongo", "postgres", "both"],
+        default="both",
+        help="Store(s) to refresh / query",
+    )
+    parser.add_argument(
+        "--table", default="mongo_import", help="Postgres table of raw samples"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Rebuild every level from scratch"
+    )
+    parser.add_argument(
+        "--timezone",
+        default=None,
+        help="Zone of the local times in the Postgres table, i.e. where the "
+        "exporter ran (default: this machine's, TZ or /etc/localtime)",
+    )
+    parser.add_argument(
+        "--track",
+        default=None,
+        help="Instead of refreshing, read the track of the last DURATION (e.g. 7d, 6h)",
+    )
+    parser.add_argument(
+        "--resolution",
+        default=None,
+        help="Wanted spacing between points for --track (e.g. 1h); default: --max-points",
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=500,
+        help="For --track without --resolution: at most about this many points",
+    )
+    args = parser.parse_args()
+
+    load_env(args.env)
+    backends = ["mongo", "postgres"] if args.backend == "both" else [args.backend]
+    conn = get_pg_connection() if "postgres" in backends else None
+    try:
+        if args.track is None:
+            for backend in backends:
+                if backend == "mongo":
+                    timings = refresh_mongo(get_collection(), args.full)
+                else:
+                    timings = refresh_postgres(
+                        conn, args.table, args.full, args.timezone
+                    )
+                print(
+                    f"{backend}: "
+                    + ", ".join(f"{level} {ms:.1f} ms" for level, ms in timings.items())
+                )
+            return
+
+        end = datetime.now()
+        start = end - timedelta(seconds=parse_duration(args.track))
+        resolution = (
+            parse_duration(args.resolution)
+            if args.resolution
+            else (end - start).total_seconds() / args.max_points
+        )
+        for backend in backends:
+            started = time.perf_counter()
+            if backend == "mongo":
+                level, rows = query_track_mongo(
+                    get_collection(), start, end, resolution
+                )
+            else:
+                level, rows = query_track_postgres(
+                    conn, args.table, start, end, resolution, args.timezone
+                )
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{backend}: {len(rows)} points from '{level}' in {elapsed:.1f} ms")
+            shown = rows if len(rows) <= 6 else rows[:3] + ["..."] + rows[-3:]
+            for row in shown:
+                print(f"  {row}")
+    finally:
+        if conn is not None:
+            release_pg_connection(conn)
+        close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,15 @@
 
 import os
 import argparse
+import asyncio
 import time
+from contextlib import nullcontext
+import aiohttp
 import requests
 from connexion import load_env, get_collection
+from buffered_writer import BufferedMongoWriter, parse_write_concern
+
+_STOP = object()
 
 
 def fetch(api_url: str):
@@ -13,15 +19,77 @@ def fetch(api_url: str):
     return resp.json()
 
 
-def store(collection, data):
-    if isinstance(data, list):
-        if not data:
-            return []
-        res = collection.insert_many(data)
-        return res.inserted_ids
-    else:
-        res = collection.insert_one(data)
-        return res.inserted_id
+# ========== MODE ASYNC ==========
+
+
+async def fetch_async(session: aiohttp.ClientSession, api_url: str):
+    async with session.get(api_url) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def poll_endpoint(session, api_url: str, tick: int, samples: asyncio.Queue):
+    try:
+        data = await fetch_async(session, api_url)
+    except Exception as e:
+        print(f"Failed to fetch {api_url} on tick {tick+1}: {e}")
+        return
+    print(f"Tick {tick+1} - fetched {api_url}")
+    # blocks when the writer is behind (bounded queue = backpressure)
+    await samples.put(data)
+
+
+async def mongo_writer(samples: asyncio.Queue, writer=None) -> int:
+    """Drain `samples` into `writer`; the buffer decides when to flush."""
+    received = 0
+    while True:
+        data = await samples.get()
+        if data is _STOP:
+            return received
+        received += 1
+        if writer is not None:
+            # pymongo is blocking: buffer/flush outside the event loop
+            await asyncio.to_thread(writer.add, data)
+
+
+async def poll_async(
+    api_urls: list[str],
+    repeat: int,
+    interval: float,
+    writer=None,
+    concurrency: int = 10,
+    queue_size: int = 1000,
+) -> int:
+    """Poll every URL `repeat` times on a fixed-rate schedule.
+
+    Tick `i` starts at `start + i * interval` whatever the response times are;
+    at most `concurrency` requests are in flight over keep-alive connections.
+    The same limit bounds the pending tasks: when the API is slower than
+    `interval`, the next ticks wait for a free slot (and start late) instead
+    of piling up. Returns the number of samples fetched.
+    """
+    samples = asyncio.Queue(maxsize=queue_size)
+    consumer = asyncio.create_task(mongo_writer(samples, writer))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        pending = set()
+        slots = asyncio.Semaphore(concurrency)
+        for i in range(repeat):
+            for api_url in api_urls:
+                await slots.acquire()
+                task = asyncio.create_task(poll_endpoint(session, api_url, i, samples))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: slots.release())
+            if i < repeat - 1 and interval > 0:
+                await asyncio.sleep(max(0.0, start + (i + 1) * interval - loop.time()))
+        await asyncio.gather(*pending)
+
+    await samples.put(_STOP)
+    return await consumer
 
 
 def demo_queries(collection, limit: int = 5):
@@ -52,7 +120,10 @@ def main():
     parser = argparse.ArgumentParser(description="Fetch API and store into MongoDB")
     parser.add_argument("--env", help="Path to .env file", default=None)
     parser.add_argument(
-        "--api", help="API URL to fetch (overrides API_URL in .env)", default=None
+        "--api",
+        help="API URL to fetch (overrides API_URL in .env). Repeat for several endpoints",
+        action="append",
+        default=None,
     )
     parser.add_argument(
         "--insert", action="store_true", help="Insert fetched data into MongoDB"
@@ -76,67 +147,114 @@ def main():
     parser.add_argument(
         "--batch",
         action="store_true",
-        help="Collect fetched items and do a single insert_many (or batched flushes)",
+        help="Buffer fetched items and write them with insert_many (see --batch-size, --max-age, --max-bytes)",
     )
     parser.add_argument(
         "--batch-size",
         type=int,
         default=0,
-        help="If >0, flush the batch every N items (uses insert_many)",
+        help="If >0, flush the batch every N items (0 = only on size/age limits)",
+    )
+    parser.add_argument(
+        "--async",
+        dest="async_mode",
+        action="store_true",
+        help="Fixed-rate asyncio/aiohttp polling with a batching Mongo writer",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Async mode: max number of requests in flight",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1000,
+        help="Async mode: max samples waiting for the Mongo writer",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=10.0,
+        help="Flush buffered documents at the latest this many seconds after the oldest one",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=4 * 1024 * 1024,
+        help="Flush once the buffered documents reach this BSON size",
+    )
+    parser.add_argument(
+        "--write-concern",
+        default=None,
+        help="Write concern for inserts, e.g. 1, 0 or majority (default: from the URL)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries for a failed insert_many before dropping the batch",
     )
     args = parser.parse_args()
 
     load_env(args.env)
 
-    api_url = args.api or os.getenv("API_URL")
-    if not api_url:
+    api_urls = args.api or [os.getenv("API_URL")]
+    if not all(api_urls):
         raise SystemExit("API URL not provided. Set API_URL in .env or pass --api")
 
     coll = None
+    writer = None
     if args.insert:
         coll = get_collection()
+        # without --batch every sample is written right away
+        max_items = (args.batch_size or None) if args.batch else 1
+        writer = BufferedMongoWriter(
+            coll,
+            max_items=max_items,
+            max_bytes=args.max_bytes,
+            max_age=args.max_age,
+            write_concern=parse_write_concern(args.write_concern),
+            retries=args.retries,
+        )
 
-    batch_items = []
-
-    for i in range(args.repeat):
-        try:
-            data = fetch(api_url)
-        except Exception as e:
-            print(f"Failed to fetch API on iteration {i+1}: {e}")
-            continue
-
-        print(f"Iteration {i+1}/{args.repeat} - fetched type:", type(data))
-
-        if args.insert and coll is not None:
-            if args.batch:
-                if isinstance(data, list):
-                    batch_items.extend(data)
-                else:
-                    batch_items.append(data)
-
-                if args.batch_size > 0 and len(batch_items) >= args.batch_size:
-                    try:
-                        res = coll.insert_many(batch_items)
-                        print(f"Flushed batch insert ({len(res.inserted_ids)} docs)")
-                    except Exception as e:
-                        print(f"Batch insert failed on iteration {i+1}: {e}")
-                    batch_items = []
-            else:
+    with writer or nullcontext():
+        if args.async_mode:
+            fetched = asyncio.run(
+                poll_async(
+                    api_urls,
+                    args.repeat,
+                    args.interval,
+                    writer=writer,
+                    concurrency=args.concurrency,
+                    queue_size=args.queue_size,
+                )
+            )
+            print(f"Async polling done ({fetched} samples fetched)")
+        else:
+            for i in range(args.repeat):
                 try:
-                    res = store(coll, data)
-                    print("Inserted:", res)
+                    data = [fetch(api_url) for api_url in api_urls]
+                    if len(data) == 1:
+                        data = data[0]
                 except Exception as e:
-                    print(f"Insert failed on iteration {i+1}: {e}")
+                    print(f"Failed to fetch API on iteration {i+1}: {e}")
+                    continue
+
+                print(f"Iteration {i+1}/{args.repeat} - fetched type:", type(data))
+
+                if writer is not None:
+                    writer.add(data)
 
-        if i < args.repeat - 1 and args.interval > 0:
-            time.sleep(args.interval)
+                if i < args.repeat - 1 and args.interval > 0:
+                    time.sleep(args.interval)
 
-    if args.insert and args.batch and coll is not None and batch_items:
-        try:
-            res = coll.insert_many(batch_items)
-            print(f"Final batch inserted ({len(res.inserted_ids)} docs)")
-        except Exception as e:
-            print(f"Final batch insert failed: {e}")
+    if writer is not None:
+        print(
+            f"Inserted {writer.inserted} docs ({writer.duplicates} duplicates, "
+            f"{writer.failed} failed)"
+        )
 
     if args.show and coll is not None:
         demo_queries(coll, limit=args.limit)
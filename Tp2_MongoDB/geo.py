@@ -0,0 +1,126 @@
+"""Spatial columns and indexes for the ISS positions.
+
+MongoDB: `location`, a GeoJSON Point built from `iss_position`, with a
+`2dsphere` index. The field is backfilled on the documents that lack it, so
+running `--mongo` again after new fetches only touches the new documents.
+
+Postgres: stored generated columns computed from `lattitude` / `longitude`,
+so the exporter keeps writing the same five columns:
+
+- `point`: `position point` (x = longitude, y = lattitude) with a GiST
+  index; planar, radius queries prefilter on a box then apply haversine;
+- `postgis`: `geog geography(Point, 4326)` with a GiST index; needs the
+  PostGIS extension (available on Supabase), distances in meters.
+
+The radius / bounding-box scenarios of `scenarios.yaml` use these columns.
+"""
+
+import argparse
+
+from connexion import (
+    close_all,
+    get_collection,
+    get_pg_connection,
+    load_env,
+    release_pg_connection,
+)
+
+GEO_FIELD = "location"
+GEO_KINDS = ("point", "postgis")
+PG_COLUMNS = {
+    "point": (
+        "position",
+        "point GENERATED ALWAYS AS (point(longitude, lattitude)) STORED",
+    ),
+    "postgis": (
+        "geog",
+        "geography(Point, 4326) GENERATED ALWAYS AS "
+        "(ST_SetSRID(ST_MakePoint(longitude, lattitude), 4326)::geography) STORED",
+    ),
+}
+
+
+# the API returns strings; documents written by the tests spell it "lattitude"
+LATITUDE = {
+    "$toDouble": {"$ifNull": ["$iss_position.latitude", "$iss_position.lattitude"]}
+}
+LONGITUDE = {"$toDouble": "$iss_position.longitude"}
+
+
+def ensure_mongo_geo(collection) -> int:
+    """Backfill `location` where missing, create the 2dsphere index; return the count."""
+    result = collection.update_many(
+        {GEO_FIELD: {"$exists": False}, "iss_position": {"$exists": True}},
+        [
+            {
+                "$set": {
+                    GEO_FIELD: {
+                        "type": "Point",
+                        "coordinates": [LONGITUDE, LATITUDE],
+                    }
+                }
+            }
+        ],
+    )
+    collection.create_index([(GEO_FIELD, "2dsphere")], name=f"{GEO_FIELD}_2dsphere")
+    return result.modified_count
+
+
+def ensure_postgres_geo(conn, table_name: str, kind: str) -> str:
+    """Add the generated column of `kind` and its GiST index; return the column."""
+    column, definition = PG_COLUMNS[kind]
+    with conn.cursor() as cur:
+        if kind == "postgis":
+            cur.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+        cur.execute(
+            f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column} {definition}"
+        )
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{column}_gist "
+            f"ON {table_name} USING gist ({column})"
+        )
+    conn.commit()
+    return column
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add spatial columns / indexes for the ISS positions"
+    )
+    parser.add_argument("--env", default=None, help="Path to .env file")
+    parser.add_argument(
+        "--mongo",
+        action="store_true",
+        help=f"Backfill the GeoJSON '{GEO_FIELD}' field and its 2dsphere index",
+    )
+    parser.add_argument(
+        "--postgres",
+        choices=GEO_KINDS + ("both",),
+        default=None,
+        help="Postgres column to add: point (GiST), postgis (geography) or both",
+    )
+    parser.add_argument(
+        "--table", default="mongo_import", help="Postgres table to extend"
+    )
+    args = parser.parse_args()
+
+    load_env(args.env)
+    try:
+        if args.mongo:
+            updated = ensure_mongo_geo(get_collection())
+            print(f"MongoDB: {updated} documents given a '{GEO_FIELD}' field")
+        if args.postgres:
+            kinds = GEO_KINDS if args.postgres == "both" else (args.postgres,)
+            conn = get_pg_connection()
+            try:
+                for kind in kinds:
+                    column = ensure_postgres_geo(conn, args.table, kind)
+                    print(f"Postgres: {args.table}.{column} ({kind}) ready")
+            finally:
+                release_pg_connection(conn)
+    finally:
+        close_all()
+
+
+if __name__ == "__main__":
+    main()
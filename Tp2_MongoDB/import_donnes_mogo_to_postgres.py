@@ -1,49 +1,80 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import os
+import io
+import csv
 import json
+import time
+import queue
 import argparse
-from pathlib import Path
-from typing import Any, Dict, Iterable
-from datetime import datetime
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator
+from datetime import datetime, timedelta
 
-from dotenv import load_dotenv
-from pymongo import MongoClient
-import psycopg2
+import numpy as np
+import pandas as pd
+from bson import ObjectId, json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 from psycopg2.extras import execute_values
 
-
-def load_env(env_path: str | None = None) -> None:
-    if env_path:
-        load_dotenv(env_path)
-    else:
-        env_file = Path(__file__).parent.joinpath(".env")
-        if env_file.exists():
-            load_dotenv(env_file)
+from connexion import (
+    close_all,
+    get_mongo_client,
+    get_pg_connection,
+    load_env,
+    release_pg_connection,
+)
+from geo import GEO_KINDS, ensure_postgres_geo
+from query_cache import invalidate
 
 
 def get_mongo_collection(mongo_url: str, db_name: str, collection_name: str):
-    client = MongoClient(mongo_url)
+    client = get_mongo_client(mongo_url)
     db = client[db_name]
     return db[collection_name]
 
 
+# Only the fields read by prepare_row / prepare_columns
+ROW_PROJECTION = {"_id": 1, "message": 1, "timestamp": 1, "iss_position": 1}
+
+
 def iter_documents(
-    collection, query: Dict[str, Any] | None = None, limit: int | None = None
+    collection,
+    query: Dict[str, Any] | None = None,
+    limit: int | None = None,
+    sort: list[tuple] | None = None,
+    raw_bson: bool = False,
+    batch_size: int | None = None,
 ) -> Iterable[Dict[str, Any]]:
-    cursor = collection.find(query or {})
+    """Yield the documents matching `query`.
+
+    With `raw_bson`, the cursor returns `RawBSONDocument`s restricted to
+    `ROW_PROJECTION`. The gain comes from the projection (smaller documents
+    to transfer and decode); a `RawBSONDocument` is decoded as a whole on the
+    first key access by `prepare_row`, not field by field.
+    `batch_size` sets how many documents each server round trip returns.
+    """
+    projection = None
+    if raw_bson:
+        collection = collection.with_options(
+            codec_options=CodecOptions(document_class=RawBSONDocument)
+        )
+        projection = ROW_PROJECTION
+    cursor = collection.find(query or {}, projection)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
     for doc in cursor:
         yield doc
 
 
-def prepare_row(doc: Dict[str, Any]) -> tuple:
-    # Convert Mongo _id to string and store the rest as JSON
-    _id = doc.get("_id")
-    id_str = str(_id)
-    message = doc.get("message")
-    timestamp = doc.get("timestamp")
+def parse_timestamp(timestamp: Any) -> datetime | None:
     # normalize timestamp: support seconds or milliseconds epochs, or ISO strings
     ts_val = None
     if isinstance(timestamp, (int, float)):
@@ -64,16 +95,202 @@ def prepare_row(doc: Dict[str, Any]) -> tuple:
                 ts_val = datetime.fromisoformat(timestamp)
             except Exception:
                 ts_val = None
+    return ts_val
+
+
+def prepare_row(doc: Dict[str, Any]) -> tuple:
+    # Convert Mongo _id to string and store the rest as JSON
+    _id = doc.get("_id")
+    id_str = str(_id)
+    message = doc.get("message")
+    ts_val = parse_timestamp(doc.get("timestamp"))
 
     lattitude = doc.get("iss_position", {}).get("latitude", 0.0)
     longitude = doc.get("iss_position", {}).get("longitude", 0.0)
     return (id_str, message, ts_val, float(lattitude), float(longitude))
 
 
-def ensure_table(conn, table_name: str):
+COLUMNS = ("id", "message", "timestamp", "lattitude", "longitude")
+
+# Epoch seconds handled by the vectorized path; anything else (NaN, out of the
+# pandas datetime range, ISO strings, bools...) goes through parse_timestamp
+_VECTOR_EPOCH_RANGE = (0, 9e9)
+_INT_STRING = r"\s*[+-]?\d+\s*"
+_EPOCH = datetime(1970, 1, 1)
+_OFFSET_BUCKET = 900
+
+
+def _utc_offset_us(seconds: int) -> int:
+    local = datetime.fromtimestamp(seconds)
+    return (local - _EPOCH) // timedelta(microseconds=1) - seconds * 1_000_000
+
+
+def local_utc_offsets(seconds: np.ndarray) -> np.ndarray:
+    """Local-time UTC offset (in microseconds) that `fromtimestamp` applies to each epoch.
+
+    The offset is looked up once per 15 min bucket; buckets containing a DST
+    transition are resolved second by second.
+    """
+    buckets, inverse = np.unique(seconds // _OFFSET_BUCKET, return_inverse=True)
+    starts = [_utc_offset_us(int(b) * _OFFSET_BUCKET) for b in buckets]
+    ends = [_utc_offset_us(int(b + 1) * _OFFSET_BUCKET - 1) for b in buckets]
+    offsets = np.asarray(starts, dtype=np.int64)[inverse]
+    for i in np.flatnonzero((np.asarray(starts) != np.asarray(ends))[inverse]):
+        offsets[i] = _utc_offset_us(int(seconds[i]))
+    return offsets
+
+
+def prepare_columns(docs: list[Dict[str, Any]]) -> pd.DataFrame:
+    """Columnar equivalent of `prepare_row` for a whole batch of documents.
+
+    Epoch seconds vs milliseconds is decided in one vectorized pass and the
+    result holds one array per column. `rows_from_columns(prepare_columns(docs))`
+    equals `[prepare_row(d) for d in docs]`.
+    """
+    positions = [doc.get("iss_position", {}) for doc in docs]
+    raw_ts = pd.Series([doc.get("timestamp") for doc in docs], dtype=object)
+
+    kinds = raw_ts.map(type)
+    numeric = kinds.isin([int, float]).to_numpy()
+    strings = (kinds == str).to_numpy()
+    int_string = np.zeros(len(docs), dtype=bool)
+    if strings.any():
+        int_string[strings] = (
+            raw_ts[strings].str.fullmatch(_INT_STRING).to_numpy(dtype=bool)
+        )
+    candidates = numeric | int_string
+
+    values = np.full(len(docs), np.nan)
+    if candidates.any():
+        values[candidates] = raw_ts[candidates].astype(float).to_numpy()
+    # heuristics: if > 1e12 assume milliseconds
+    seconds = np.where(values > 1e12, values / 1000.0, values)
+    low, high = _VECTOR_EPOCH_RANGE
+    vectorized = candidates & (seconds >= low) & (seconds < high)
+
+    # same rounding as datetime.fromtimestamp: half-even on the microseconds,
+    # then the UTC offset of the rounded second (x.9999996 can cross a DST change)
+    frac, whole = np.modf(np.where(vectorized, seconds, 0.0))
+    micros = whole.astype(np.int64) * 1_000_000 + np.round(frac * 1e6).astype(np.int64)
+    micros += local_utc_offsets(micros // 1_000_000)
+    timestamps = pd.Series(micros.astype("datetime64[us]")).where(vectorized)
+
+    fallback = np.flatnonzero(~vectorized & (kinds != type(None)).to_numpy())
+    if len(fallback):
+        timestamps = timestamps.astype(object).where(vectorized, None)
+        timestamps.iloc[fallback] = [parse_timestamp(raw_ts.iat[i]) for i in fallback]
+
+    return pd.DataFrame(
+        {
+            "id": [str(doc.get("_id")) for doc in docs],
+            "message": pd.Series([doc.get("message") for doc in docs], dtype=object),
+            "timestamp": timestamps,
+            "lattitude": np.array(
+                [pos.get("latitude", 0.0) for pos in positions], dtype=object
+            ).astype(float),
+            "longitude": np.array(
+                [pos.get("longitude", 0.0) for pos in positions], dtype=object
+            ).astype(float),
+        },
+        columns=COLUMNS,
+    )
+
+
+def rows_from_columns(frame: pd.DataFrame) -> list[tuple]:
+    """Turn a `prepare_columns` frame back into `prepare_row`-style tuples."""
+    timestamps = [
+        (
+            None
+            if pd.isna(ts)
+            else ts.to_pydatetime() if isinstance(ts, pd.Timestamp) else ts
+        )
+        for ts in frame["timestamp"].astype(object)
+    ]
+    return list(
+        zip(
+            frame["id"].tolist(),
+            frame["message"].tolist(),
+            timestamps,
+            frame["lattitude"].tolist(),
+            frame["longitude"].tolist(),
+        )
+    )
+
+
+# ========== SCHEMA ==========
+
+# `id` column: the ObjectId as 24-character hex TEXT (default) or as its 12
+# raw bytes, which halves the primary key and every ON CONFLICT probe. Rows
+# always carry the hex string (prepare_row, checkpoints); the SQL expressions
+# below turn it into the stored value on insert, and back into hex.
+ID_TYPES = {"text": "TEXT", "bytea": "BYTEA CHECK (octet_length(id) = 12)"}
+ID_FROM_HEX = {"text": "{}", "bytea": "decode({}, 'hex')"}
+ID_TO_HEX = {"text": "{}", "bytea": "encode({}, 'hex')"}
+
+
+def table_id_type(conn, table_name: str) -> str:
+    """'bytea' or 'text', read from the catalog, so existing tables keep their type."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s "
+            "AND column_name = 'id'",
+            (table_name,),
+        )
+        row = cur.fetchone()
+    conn.commit()
+    return "bytea" if row and row[0] == "bytea" else "text"
+
+
+def id_to_pg(_id, id_type: str):
+    """Value to bind for `id` (lookups by Mongo `_id`); bytea needs an ObjectId."""
+    if id_type == "bytea":
+        return ObjectId(_id).binary
+    return str(_id)
+
+
+# Indexes on `timestamp`. Rows arrive in _id (= fetch time) order, so the
+# physical order follows `timestamp`: a BRIN index (one summary per 128 pages)
+# is enough to skip most of the table on a time range. The covering B-tree is
+# much larger but also answers `timestamp`-ordered and (timestamp, position)
+# reads with index-only scans.
+TIME_INDEXES = {
+    "brin": "USING brin (timestamp)",
+    "covering": "(timestamp) INCLUDE (lattitude, longitude)",
+}
+
+
+def time_index_name(table_name: str, kind: str) -> str:
+    return f"idx_{table_name}_timestamp_{kind}"
+
+
+def ensure_time_indexes(conn, table_name: str, kinds: Iterable[str]) -> list[str]:
+    """Create the `TIME_INDEXES` of `kinds` if missing; return their names."""
+    names = []
+    with conn.cursor() as cur:
+        for kind in kinds:
+            name = time_index_name(table_name, kind)
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table_name} {TIME_INDEXES[kind]}"
+            )
+            names.append(name)
+    conn.commit()
+    return names
+
+
+def ensure_table(
+    conn, table_name: str, time_indexes: Iterable[str] = (), id_type: str = "text"
+):
+    """Create the table; `time_indexes` (keys of `TIME_INDEXES`) right away.
+
+    Before a bulk load, leave `time_indexes` empty and call
+    `ensure_time_indexes` once the rows are in: one index build is much
+    cheaper than maintaining the index row by row. `id_type` (key of
+    `ID_TYPES`) only applies when the table is created.
+    """
     sql = f"""
     CREATE TABLE IF NOT EXISTS {table_name} (
-        id TEXT PRIMARY KEY,
+        id {ID_TYPES[id_type]} PRIMARY KEY,
         message VARCHAR(255) NOT NULL,
         timestamp TIMESTAMP,
         lattitude FLOAT NOT NULL,
@@ -83,18 +300,540 @@ def ensure_table(conn, table_name: str):
     with conn.cursor() as cur:
         cur.execute(sql)
         conn.commit()
+    if time_indexes:
+        ensure_time_indexes(conn, table_name, time_indexes)
 
 
-def batch_insert(conn, table_name: str, rows: list[tuple]):
-    if not rows:
+def batch_insert(
+    conn, table_name: str, rows: list[tuple], before_commit=None, id_type="text"
+):
+    if len(rows) == 0:
         return 0
+    if isinstance(rows, pd.DataFrame):
+        rows = rows_from_columns(rows)
     sql = f"INSERT INTO {table_name} (id, message, timestamp, lattitude, longitude) VALUES %s ON CONFLICT (id) DO NOTHING"
+    template = f"({ID_FROM_HEX[id_type].format('%s')}, %s, %s, %s, %s)"
     with conn.cursor() as cur:
-        execute_values(cur, sql, rows, template=None, page_size=1000)
+        execute_values(cur, sql, rows, template=template, page_size=1000)
+        if before_commit:
+            before_commit(cur, rows)
         conn.commit()
     return len(rows)
 
 
+def staging_table_name(table_name: str) -> str:
+    return f"{table_name}_staging"
+
+
+def create_staging_table(cur, table_name: str):
+    # Created inside each batch transaction and dropped at its commit: with a
+    # transaction-mode pooler (Supabase, port 6543) the next transaction may run
+    # on another backend, where a session temp table would not exist. `id`
+    # holds the hex string, converted by the INSERT ... SELECT
+    staging = staging_table_name(table_name)
+    cur.execute(f"""
+        CREATE TEMP TABLE {staging}
+        (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP;
+        ALTER TABLE {staging} ALTER COLUMN id TYPE TEXT;
+        """)
+
+
+def write_copy_buffer(buf: io.StringIO, rows: list[tuple]) -> None:
+    # Reuse the same buffer between batches instead of allocating a new one
+    buf.seek(0)
+    buf.truncate(0)
+    # None is written as "" and mapped back to NULL by FORCE_NULL (timestamp)
+    if isinstance(rows, pd.DataFrame):
+        rows.to_csv(
+            buf,
+            header=False,
+            index=False,
+            quoting=csv.QUOTE_NONNUMERIC,
+            lineterminator="\n",
+        )
+    else:
+        writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        writer.writerows(rows)
+    buf.seek(0)
+
+
+def copy_insert(
+    conn,
+    table_name: str,
+    rows: list[tuple],
+    buf: io.StringIO,
+    before_commit=None,
+    id_type="text",
+):
+    if len(rows) == 0:
+        return 0
+    staging = staging_table_name(table_name)
+    columns = "id, message, timestamp, lattitude, longitude"
+    values = columns.replace("id", ID_FROM_HEX[id_type].format("id"), 1)
+    write_copy_buffer(buf, rows)
+    with conn.cursor() as cur:
+        create_staging_table(cur, table_name)
+        cur.copy_expert(
+            f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NULL (timestamp))",
+            buf,
+        )
+        cur.execute(
+            f"INSERT INTO {table_name} ({columns}) SELECT {values} FROM {staging} ON CONFLICT (id) DO NOTHING"
+        )
+        if before_commit:
+            before_commit(cur, rows)
+        conn.commit()
+    return len(rows)
+
+
+def make_inserter(conn, table_name: str, mode: str, before_commit=None):
+    """Return an `insert(rows)` callable for the selected load mode.
+
+    - `insert`: multi-row INSERT via `execute_values`
+    - `copy`: COPY into a temp staging table (created and dropped by each batch
+      transaction) then one INSERT ... SELECT
+
+    `before_commit(cur, rows)` runs inside each batch transaction, just before commit.
+    The hex ids of the rows are converted to the `id` type of the table. After
+    each committed batch, cached query results on the table are invalidated.
+    """
+    id_type = table_id_type(conn, table_name)
+    if mode == "copy":
+        buf = io.StringIO()
+
+    def insert(rows):
+        if mode == "copy":
+            written = copy_insert(conn, table_name, rows, buf, before_commit, id_type)
+        else:
+            written = batch_insert(conn, table_name, rows, before_commit, id_type)
+        if written:
+            invalidate(table_name)
+        return written
+
+    return insert
+
+
+# ========== INCREMENTAL SYNC ==========
+
+CHECKPOINT_TABLE = "sync_checkpoint"
+
+
+def ensure_checkpoint_table(conn):
+    sql = f"""
+    CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+        table_name TEXT PRIMARY KEY,
+        last_id TEXT NOT NULL,
+        last_timestamp TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    ALTER TABLE {CHECKPOINT_TABLE} ADD COLUMN IF NOT EXISTS resume_token TEXT;
+    ALTER TABLE {CHECKPOINT_TABLE} ADD COLUMN IF NOT EXISTS source TEXT;
+    ALTER TABLE {CHECKPOINT_TABLE} ADD COLUMN IF NOT EXISTS query TEXT;
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        conn.commit()
+
+
+def reset_checkpoint(conn, table_name: str):
+    with conn.cursor() as cur:
+        cur.execute(
+            f"DELETE FROM {CHECKPOINT_TABLE} WHERE table_name = %s", (table_name,)
+        )
+        conn.commit()
+
+
+def checkpoint_scope(coll, query: Dict[str, Any] | None) -> tuple[str, str]:
+    """(source collection, normalized query) a checkpoint is only valid for."""
+    source = f"{coll.database.name}.{coll.name}"
+    return source, json_util.dumps(query, sort_keys=True) if query else ""
+
+
+class CheckpointMismatch(ValueError):
+    """The saved checkpoint belongs to another collection or query."""
+
+
+def _load_checkpoint_row(conn, table_name: str, scope: tuple[str, str]):
+    """Checkpoint row of `table_name`; CheckpointMismatch if saved for another scope.
+
+    Resuming from the high-water mark of another collection or `--query`
+    would silently skip documents. Rows saved before the scope was recorded
+    (NULL source) are accepted and get it on the next save.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT last_id, resume_token, source, query FROM {CHECKPOINT_TABLE} "
+            "WHERE table_name = %s",
+            (table_name,),
+        )
+        row = cur.fetchone()
+    conn.commit()
+    if row and row[2] is not None and (row[2], row[3] or "") != scope:
+        raise CheckpointMismatch(
+            f"The {CHECKPOINT_TABLE} entry of {table_name} was saved for "
+            f"{row[2]} with query {row[3] or '{}'}, not {scope[0]} with query "
+            f"{scope[1] or '{}'}: use another --table or --drop-table to restart"
+        )
+    return row
+
+
+def load_checkpoint(
+    conn, table_name: str, scope: tuple[str, str] = ("", "")
+) -> str | None:
+    """Return the last `_id` committed into `table_name`, or None on first run."""
+    row = _load_checkpoint_row(conn, table_name, scope)
+    return row[0] if row else None
+
+
+def load_resume_token(conn, table_name: str, scope: tuple[str, str] = ("", "")):
+    """Return the change stream resume token saved for `table_name`, if any."""
+    row = _load_checkpoint_row(conn, table_name, scope)
+    return json_util.loads(row[1]) if row and row[1] else None
+
+
+def save_checkpoint(
+    cur,
+    table_name: str,
+    rows: list[tuple],
+    resume_token=None,
+    scope: tuple[str, str] = ("", ""),
+):
+    # Rows come sorted by _id, so the last one is the new high-water mark
+    if isinstance(rows, pd.DataFrame):
+        rows = rows_from_columns(rows.tail(1))
+    last_id, _, last_ts, _, _ = rows[-1]
+    token = json_util.dumps(resume_token) if resume_token else None
+    cur.execute(
+        f"""
+        INSERT INTO {CHECKPOINT_TABLE} (table_name, last_id, last_timestamp, updated_at, resume_token, source, query)
+        VALUES (%s, %s, %s, now(), %s, %s, %s)
+        ON CONFLICT (table_name) DO UPDATE
+        SET last_id = EXCLUDED.last_id,
+            last_timestamp = EXCLUDED.last_timestamp,
+            updated_at = EXCLUDED.updated_at,
+            resume_token = COALESCE(EXCLUDED.resume_token, {CHECKPOINT_TABLE}.resume_token),
+            source = EXCLUDED.source,
+            query = EXCLUDED.query
+        """,
+        (table_name, last_id, last_ts, token, *scope),
+    )
+
+
+def incremental_query(
+    query: Dict[str, Any] | None, last_id: str | None
+) -> Dict[str, Any] | None:
+    """Restrict `query` to documents whose `_id` is past the checkpoint."""
+    if last_id is None:
+        return query
+    bound = ObjectId(last_id) if ObjectId.is_valid(last_id) else last_id
+    id_filter = {"_id": {"$gt": bound}}
+    return {"$and": [query, id_filter]} if query else id_filter
+
+
+# ========== PIPELINE ==========
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def prefetch(iterable: Iterable, maxsize: int) -> Iterator:
+    """Consume `iterable` in a background thread, keeping at most `maxsize` items ahead.
+
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        # give up once the consumer is gone instead of blocking forever
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+        except BaseException as e:
+            put((False, e))
+            return
+        put((False, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            ok, value = items.get()
+            if ok:
+                yield value
+            elif value is not None:
+                raise value
+            else:
+                return
+    finally:
+        stop.set()
+
+
+def transfer(
+    coll,
+    conn,
+    table_name: str,
+    query: Dict[str, Any] | None = None,
+    limit: int | None = None,
+    batch_size: int = 500,
+    mode: str = "insert",
+    progress=None,
+    checkpoint: bool = False,
+    checkpoint_scope: tuple[str, str] = ("", ""),
+    columnar: bool = False,
+    raw_bson: bool = False,
+    cursor_batch_size: int | None = None,
+    pipeline: bool = False,
+    queue_size: int = 4,
+) -> int:
+    """Copy the documents matching `query` into `table_name`, batch by batch.
+
+    `progress(inserted)` is called after each batch; by default a line is printed.
+    With `checkpoint`, documents are read in `_id` order and the high-water mark
+    is saved in the same transaction as each batch, tagged with
+    `checkpoint_scope` (see `checkpoint_scope()`). With `columnar`, each batch
+    is converted at once by `prepare_columns` instead of row by row. With
+    `pipeline`, reading, converting and writing overlap instead of alternating.
+    """
+    before_commit = None
+    sort = None
+    if checkpoint:
+
+        def before_commit(cur, rows):
+            save_checkpoint(cur, table_name, rows, scope=checkpoint_scope)
+
+        sort = [("_id", 1)]
+    insert = make_inserter(conn, table_name, mode, before_commit)
+
+    def convert(batch):
+        return prepare_columns(batch) if columnar else [prepare_row(d) for d in batch]
+
+    documents = iter_documents(
+        coll,
+        query=query,
+        limit=limit,
+        sort=sort,
+        raw_bson=raw_bson,
+        batch_size=cursor_batch_size,
+    )
+    # read -> convert -> write; with `pipeline` each stage runs in its own
+    # thread and hands batches over through a bounded queue (backpressure)
+    batches = chunked(documents, batch_size)
+    if pipeline:
+        batches = prefetch(batches, queue_size)
+    converted = (convert(batch) for batch in batches)
+    if pipeline:
+        converted = prefetch(converted, queue_size)
+
+    total = 0
+    flushed_partial = False
+    for rows in converted:
+        inserted = insert(rows)
+        total += inserted
+        if progress:
+            progress(inserted)
+        elif len(rows) < batch_size:
+            # only the last batch can be partial
+            flushed_partial = True
+            print(f"Final insert: {inserted} rows. Total inserted: {total}")
+        else:
+            print(f"Inserted batch {total} rows (last batch {inserted})")
+
+    if not (progress or flushed_partial):
+        print(f"Total inserted: {total}")
+
+    return total
+
+
+# ========== PARALLEL TRANSFER ==========
+
+
+def compute_id_boundaries(
+    collection, query: Dict[str, Any] | None, partitions: int, oversample: int = 32
+) -> list:
+    """Estimate `partitions - 1` `_id` split points from a `$sample` of the collection."""
+    if partitions <= 1:
+        return []
+    pipeline = [{"$match": query}] if query else []
+    pipeline += [
+        {"$sample": {"size": partitions * oversample}},
+        {"$project": {"_id": 1}},
+    ]
+    ids = sorted({doc["_id"] for doc in collection.aggregate(pipeline)})
+    if not ids:
+        return []
+    boundaries = []
+    for i in range(1, partitions):
+        candidate = ids[len(ids) * i // partitions]
+        if not boundaries or candidate > boundaries[-1]:
+            boundaries.append(candidate)
+    return boundaries
+
+
+def id_ranges(boundaries: list) -> list[tuple]:
+    """Turn sorted split points into disjoint `[lo, hi)` ranges (None = unbounded)."""
+    edges = [None, *boundaries, None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def range_query(query: Dict[str, Any] | None, lo, hi) -> Dict[str, Any]:
+    id_filter = {}
+    if lo is not None:
+        id_filter["$gte"] = lo
+    if hi is not None:
+        id_filter["$lt"] = hi
+    parts = [q for q in (query, {"_id": id_filter} if id_filter else None) if q]
+    if not parts:
+        return {}
+    return parts[0] if len(parts) == 1 else {"$and": parts}
+
+
+def transfer_partition(task: Dict[str, Any], progress_queue) -> Dict[str, Any]:
+    """Worker entry point: own Mongo client and Postgres connection per partition."""
+    coll = get_mongo_collection(
+        task["mongo_url"], task["mongo_db"], task["mongo_collection"]
+    )
+    conn = get_pg_connection(task["pg_url"])
+    start = time.perf_counter()
+    try:
+        total = transfer(
+            coll,
+            conn,
+            task["table"],
+            query=task["query"],
+            batch_size=task["batch_size"],
+            mode=task["mode"],
+            columnar=task["columnar"],
+            raw_bson=task["raw_bson"],
+            cursor_batch_size=task["cursor_batch_size"],
+            pipeline=task["pipeline"],
+            queue_size=task["queue_size"],
+            progress=lambda n: progress_queue.put((task["partition"], n)),
+        )
+    finally:
+        release_pg_connection(conn, task["pg_url"])
+        close_all()
+    return {
+        "partition": task["partition"],
+        "total": total,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def run_parallel(base_task: Dict[str, Any], query, ranges: list[tuple]) -> tuple:
+    """Run one worker process per `_id` range. Returns (total rows, failed partitions)."""
+    total = 0
+    failures = []
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        progress_queue = manager.Queue()
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=ctx) as pool:
+            futures = {}
+            for i, (lo, hi) in enumerate(ranges):
+                task = dict(base_task, partition=i, query=range_query(query, lo, hi))
+                futures[pool.submit(transfer_partition, task, progress_queue)] = i
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                while not progress_queue.empty():
+                    partition, inserted = progress_queue.get()
+                    total += inserted
+                    print(
+                        f"Inserted batch {total} rows (partition {partition}, last batch {inserted})"
+                    )
+                for future in done:
+                    partition = futures[future]
+                    try:
+                        result = future.result()
+                        print(
+                            f"Partition {partition} done: {result['total']} rows in {result['elapsed']:.2f}s"
+                        )
+                    except Exception as e:
+                        print(f"Partition {partition} failed: {e}")
+                        failures.append(partition)
+
+            # progress messages still in flight when the last worker returned
+            while not progress_queue.empty():
+                total += progress_queue.get()[1]
+    return total, failures
+
+
+# ========== CHANGE STREAM FOLLOW ==========
+
+
+def follow_changes(
+    coll,
+    conn,
+    table_name: str,
+    flush_rows: int = 1000,
+    flush_ms: int = 200,
+    mode: str = "insert",
+) -> int:
+    """Tail the collection change stream and micro-batch inserts into Postgres.
+
+    A batch is flushed when it holds `flush_rows` rows or when its oldest row
+    has waited `flush_ms`. The resume token is saved with each batch so a
+    restart continues exactly after the last committed change.
+    """
+    # --query is ignored in follow mode: the scope is the collection alone
+    scope = checkpoint_scope(coll, None)
+    token = load_resume_token(conn, table_name, scope)
+    if token:
+        print("Resuming change stream from saved token")
+    else:
+        print("No saved resume token: following new inserts from now on")
+
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    total = 0
+    with coll.watch(pipeline, resume_after=token, max_await_time_ms=flush_ms) as stream:
+
+        def before_commit(cur, rows):
+            save_checkpoint(cur, table_name, rows, stream.resume_token, scope)
+
+        insert = make_inserter(conn, table_name, mode, before_commit)
+        batch = []
+        deadline = None
+        try:
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    batch.append(prepare_row(change["fullDocument"]))
+                    if deadline is None:
+                        deadline = time.monotonic() + flush_ms / 1000.0
+                if batch and (len(batch) >= flush_rows or time.monotonic() >= deadline):
+                    inserted = insert(batch)
+                    total += inserted
+                    print(f"Inserted batch {total} rows (last batch {inserted})")
+                    batch = []
+                    deadline = None
+        except KeyboardInterrupt:
+            print("Stopping follow mode")
+        finally:
+            if batch:
+                inserted = insert(batch)
+                total += inserted
+                print(f"Final insert: {inserted} rows. Total inserted: {total}")
+    return total
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Export MongoDB -> Postgres (Supabase)"
@@ -120,15 +859,97 @@ def main():
     parser.add_argument(
         "--batch-size", type=int, default=500, help="Number of rows per INSERT batch"
     )
+    parser.add_argument(
+        "--mode",
+        choices=("insert", "copy"),
+        default="insert",
+        help="Load engine: multi-row INSERT (default) or COPY through a staging table",
+    )
     parser.add_argument(
         "--limit",
         type=int,
         default=0,
         help="Max number of documents to transfer (0 = all)",
     )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Convert each batch with the vectorized prepare_columns instead of prepare_row",
+    )
+    parser.add_argument(
+        "--raw-bson",
+        action="store_true",
+        help="Read RawBSONDocument with a projection on the exported fields only",
+    )
+    parser.add_argument(
+        "--cursor-batch-size",
+        type=int,
+        default=0,
+        help="Documents per Mongo cursor round trip (0 = server default)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap Mongo reads, conversion and Postgres writes in separate threads",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=4,
+        help="Pipeline mode: max batches buffered between two stages",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, each copying a disjoint _id range",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Only copy documents past the _id stored in {CHECKPOINT_TABLE}, and advance it",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep running and replicate new inserts from the collection change stream",
+    )
+    parser.add_argument(
+        "--flush-rows",
+        type=int,
+        default=1000,
+        help="Follow mode: flush a batch once it holds this many rows",
+    )
+    parser.add_argument(
+        "--flush-ms",
+        type=int,
+        default=200,
+        help="Follow mode: flush a batch once its oldest row waited this long (ms)",
+    )
     parser.add_argument(
         "--drop-table", action="store_true", help="Drop table before creating it"
     )
+    parser.add_argument(
+        "--geo",
+        choices=GEO_KINDS + ("both",),
+        default=None,
+        help="Also keep a spatial column (generated from lattitude/longitude) with a GiST index: "
+        "point, postgis (geography) or both",
+    )
+    parser.add_argument(
+        "--id-type",
+        choices=tuple(ID_TYPES),
+        default="text",
+        help="Type of the id column when the table is created: hex TEXT or the "
+        "12 ObjectId bytes (bytea)",
+    )
+    parser.add_argument(
+        "--time-index",
+        choices=tuple(TIME_INDEXES) + ("both",),
+        default=None,
+        help="Index timestamp with BRIN, a covering B-tree INCLUDE (lattitude, longitude) "
+        "or both, created after the load (before streaming in follow mode)",
+    )
     parser.add_argument(
         "--query", default=None, help="Mongo query as JSON string to filter documents"
     )
@@ -160,37 +981,131 @@ def main():
     else:
         query = None
 
+    if args.workers > 1 and args.limit:
+        raise SystemExit("--limit cannot be combined with --workers > 1")
+    if args.workers > 1 and args.incremental:
+        raise SystemExit("--incremental cannot be combined with --workers > 1")
+    if args.follow and (args.workers > 1 or args.incremental or args.limit):
+        raise SystemExit(
+            "--follow cannot be combined with --workers, --incremental or --limit"
+        )
+
     coll = get_mongo_collection(mongo_url, mongo_db, mongo_collection)
 
-    conn = psycopg2.connect(pg_url)
+    conn = get_pg_connection(pg_url)
 
     if args.drop_table:
         with conn.cursor() as cur:
             cur.execute(f"DROP TABLE IF EXISTS {args.table}")
             conn.commit()
 
-    ensure_table(conn, args.table)
+    time_indexes = ()
+    if args.time_index:
+        time_indexes = (
+            tuple(TIME_INDEXES) if args.time_index == "both" else (args.time_index,)
+        )
 
-    batch = []
-    total = 0
-    limit = args.limit or None
-    for doc in iter_documents(coll, query=query, limit=limit):
-        batch.append(prepare_row(doc))
-        if len(batch) >= args.batch_size:
-            inserted = batch_insert(conn, args.table, batch)
-            total += inserted
-            print(f"Inserted batch {total} rows (last batch {inserted})")
-            batch = []
+    # Bulk loads build the time indexes at the end, follow mode needs them now
+    ensure_table(
+        conn, args.table, time_indexes if args.follow else (), id_type=args.id_type
+    )
+    if args.geo:
+        for kind in GEO_KINDS if args.geo == "both" else (args.geo,):
+            ensure_postgres_geo(conn, args.table, kind)
 
-    # final flush
-    if batch:
-        inserted = batch_insert(conn, args.table, batch)
-        total += inserted
-        print(f"Final insert: {inserted} rows. Total inserted: {total}")
-    else:
+    if args.incremental or args.follow:
+        ensure_checkpoint_table(conn)
+        if args.drop_table:
+            reset_checkpoint(conn, args.table)
+
+    scope = checkpoint_scope(coll, query)
+    if args.incremental:
+        try:
+            last_id = load_checkpoint(conn, args.table, scope)
+        except CheckpointMismatch as e:
+            raise SystemExit(str(e))
+        if last_id:
+            print(f"Resuming after _id {last_id}")
+        query = incremental_query(query, last_id)
+
+    if args.follow:
+        if query:
+            print("Note: --query is ignored in follow mode")
+        try:
+            follow_changes(
+                coll,
+                conn,
+                args.table,
+                flush_rows=args.flush_rows,
+                flush_ms=args.flush_ms,
+                mode=args.mode,
+            )
+        except CheckpointMismatch as e:
+            raise SystemExit(str(e))
+        finally:
+            release_pg_connection(conn, pg_url)
+            close_all()
+        return
+
+    start = time.perf_counter()
+    failures = []
+    if args.workers > 1:
+        ranges = id_ranges(compute_id_boundaries(coll, query, args.workers))
+        release_pg_connection(conn, pg_url)
+        close_all()
+        print(f"Starting {len(ranges)} workers over disjoint _id ranges")
+        base_task = {
+            "mongo_url": mongo_url,
+            "mongo_db": mongo_db,
+            "mongo_collection": mongo_collection,
+            "pg_url": pg_url,
+            "table": args.table,
+            "batch_size": args.batch_size,
+            "mode": args.mode,
+            "columnar": args.columnar,
+            "raw_bson": args.raw_bson,
+            "cursor_batch_size": args.cursor_batch_size or None,
+            "pipeline": args.pipeline,
+            "queue_size": args.queue_size,
+        }
+        total, failures = run_parallel(base_task, query, ranges)
         print(f"Total inserted: {total}")
+    else:
+        total = transfer(
+            coll,
+            conn,
+            args.table,
+            query=query,
+            limit=args.limit or None,
+            batch_size=args.batch_size,
+            mode=args.mode,
+            checkpoint=args.incremental,
+            checkpoint_scope=scope,
+            columnar=args.columnar,
+            raw_bson=args.raw_bson,
+            cursor_batch_size=args.cursor_batch_size or None,
+            pipeline=args.pipeline,
+            queue_size=args.queue_size,
+        )
+        release_pg_connection(conn, pg_url)
+        close_all()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"Mode {args.mode}: {total} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+
+    if time_indexes:
+        start = time.perf_counter()
+        conn = get_pg_connection(pg_url)
+        try:
+            names = ensure_time_indexes(conn, args.table, time_indexes)
+        finally:
+            release_pg_connection(conn, pg_url)
+            close_all()
+        print(f"Indexes {', '.join(names)} in {time.perf_counter() - start:.2f}s")
 
-    conn.close()
+    if failures:
+        raise SystemExit(f"{len(failures)} partition(s) failed: {sorted(failures)}")
 
 
 if __name__ == "__main__":
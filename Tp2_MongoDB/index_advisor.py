@@ -0,0 +1,664 @@
+"""Index advisor: propose, benchmark and rank Postgres indexes for a workload.
+
+A workload is a `.sql` file of `;`-separated queries (a leading `EXPLAIN` /
+`EXPLAIN ANALYZE` is ignored, e.g. `Tp1_postgres/Selects.sql`) or a scenario
+file like `scenarios.yaml` (its `sql` / `params`, optional `weight`).
+
+Each query is parsed for its equality / range filters, join columns,
+GROUP BY / ORDER BY and selected columns, resolved against the catalog. From
+those, candidates are generated per table:
+
+- single-column btree on each filtered / joined column;
+- composite btree: equality columns, then join columns, then one range column;
+- covering btree: the same key `INCLUDE` the other columns the query reads;
+- partial btree when a filter compares a low-cardinality column to a literal;
+- BRIN on time columns used in filters or ordering (check `correlation`).
+
+Candidates already served by an existing index (same leading columns) are
+skipped. Each remaining candidate is created, the queries touching its table
+are re-run (`EXPLAIN (ANALYZE, FORMAT JSON)`, server time + plan in one pass),
+then a bulk insert into a temp copy of the table measures the write penalty,
+and the index is dropped. Candidates are ranked by the milliseconds saved per
+workload run on the queries whose plan uses the index, minus the write
+penalty.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import yaml
+from psycopg2 import errors
+
+from benchmark import BenchConfig, run_benchmark
+from connexion import close_all, get_pg_connection, load_env, release_pg_connection
+from plans import normalize_postgres_plan
+
+DEFAULT_WORKLOAD = Path(__file__).parent.parent.joinpath("Tp1_postgres", "Selects.sql")
+
+TIME_TYPES = {"timestamp without time zone", "timestamp with time zone", "date"}
+# at most this many distinct values for a partial-index predicate column
+LOW_CARDINALITY = 10
+MAX_INCLUDE = 4
+
+_REF = r"(?:([a-z_]\w*)\.)?([a-z_]\w*)"
+_LITERAL = r"'(?:[^']|'')*'|-?\d+(?:\.\d+)?|%\(\w+\)s|%s|true|false"
+_COMPARE = re.compile(
+    rf"{_REF}\s*(=|<>|!=|<=|>=|<|>)\s*(?:({_LITERAL})|{_REF})", re.IGNORECASE
+)
+_RANGE_OP = re.compile(rf"{_REF}\s+(?:not\s+)?(?:between|i?like)\b", re.IGNORECASE)
+_IN = re.compile(rf"{_REF}\s+(?:not\s+)?in\s*\(\s*(select\b)?", re.IGNORECASE)
+_TABLE = re.compile(
+    r"\b(?:from|join)\s+([a-z_][\w.]*)(?:\s+(?:as\s+)?([a-z_]\w*))?", re.IGNORECASE
+)
+_KEYWORDS = {
+    "on", "where", "inner", "left", "right", "full", "outer", "cross", "join",
+    "group", "order", "limit", "offset", "having", "using", "natural", "union",
+    "select", "and", "or", "not", "as", "asc", "desc", "nulls", "first", "last",
+    "by", "in", "is", "null", "true", "false", "distinct", "case", "when",
+}  # fmt: skip
+
+
+# ========== WORKLOAD ==========
+
+
+def strip_explain(sql: str) -> str:
+    sql = re.sub(r"^\s*explain\s*\([^)]*\)\s*", "", sql, flags=re.IGNORECASE)
+    return re.sub(
+        r"^\s*explain(\s+analy[sz]e)?(\s+verbose)?\s+", "", sql, flags=re.IGNORECASE
+    )
+
+
+def load_workload(path) -> list[dict]:
+    """Queries of a `.sql` or scenario `.yaml` file as `{name, sql, params, weight}`."""
+    path = Path(path)
+    if path.suffix in (".yaml", ".yml"):
+        with open(path, encoding="utf-8") as f:
+            scenarios = yaml.safe_load(f)["scenarios"]
+        return [
+            {
+                "name": scenario["name"],
+                "sql": scenario["sql"],
+                "params": scenario.get("params") or None,
+                "weight": scenario.get("weight", 1),
+            }
+            for scenario in scenarios
+            if scenario.get("sql")
+        ]
+
+    text = path.read_text(encoding="utf-8")
+    text = re.sub(r"--[^\n]*", "", text)
+    queries = []
+    for statement in text.split(";"):
+        sql = " ".join(strip_explain(statement).split())
+        if sql:
+            queries.append(
+                {
+                    "name": f"{path.name}#{len(queries) + 1}",
+                    "sql": sql,
+                    "params": None,
+                    "weight": 1,
+                }
+            )
+    return queries
+
+
+# ========== CATALOG ==========
+
+
+def load_catalog(conn) -> dict:
+    """Columns, existing indexes and column statistics of the current schema."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema()"
+        )
+        columns = {}
+        for table, column, data_type in cur.fetchall():
+            columns.setdefault(table, {})[column] = data_type
+
+        cur.execute(
+            "SELECT tablename, indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema()"
+        )
+        indexes = {}
+        for table, name, indexdef in cur.fetchall():
+            match = re.search(r"USING (\w+) \((.*?)\)", indexdef)
+            if match:
+                keys = [col.strip().strip('"') for col in match.group(2).split(",")]
+                indexes.setdefault(table, []).append(
+                    {"name": name, "method": match.group(1), "columns": keys}
+                )
+
+        cur.execute(
+            "SELECT tablename, attname, n_distinct, correlation FROM pg_stats "
+            "WHERE schemaname = current_schema()"
+        )
+        stats = {
+            (table, column): {"n_distinct": n_distinct, "correlation": correlation}
+            for table, column, n_distinct, correlation in cur.fetchall()
+        }
+    return {"columns": columns, "indexes": indexes, "stats": stats}
+
+
+# ========== QUERY ANALYSIS ==========
+
+
+@dataclass
+class TableUsage:
+    """How one query uses the columns of one table."""
+
+    eq: list = field(default_factory=list)
+    range: list = field(default_factory=list)
+    join: list = field(default_factory=list)
+    order: list = field(default_factory=list)
+    select: list = field(default_factory=list)
+    select_all: bool = False
+    # (column, literal) pairs of equality filters, for partial indexes
+    literals: list = field(default_factory=list)
+
+
+def _add(values: list, value) -> None:
+    if value not in values:
+        values.append(value)
+
+
+def analyze_query(sql: str, catalog: dict) -> dict[str, TableUsage]:
+    """Map each table of `sql` to the columns it filters, joins, orders and reads."""
+    columns = catalog["columns"]
+    aliases, tables = {}, []
+    for match in _TABLE.finditer(sql):
+        table = match.group(1).split(".")[-1].lower()
+        if table not in columns:
+            continue
+        _add(tables, table)
+        aliases[table] = table
+        alias = (match.group(2) or "").lower()
+        if alias and alias not in _KEYWORDS:
+            aliases[alias] = table
+
+    def resolve(qualifier, column):
+        column = column.lower()
+        if qualifier:
+            table = aliases.get(qualifier.lower())
+            return (table, column) if table and column in columns[table] else None
+        owners = [table for table in tables if column in columns[table]]
+        return (owners[0], column) if len(owners) == 1 else None
+
+    usage = {table: TableUsage() for table in tables}
+
+    for match in _COMPARE.finditer(sql):
+        left = resolve(match.group(1), match.group(2))
+        operator, literal = match.group(3), match.group(4)
+        if literal is not None:
+            if left:
+                role = "eq" if operator == "=" else "range"
+                _add(getattr(usage[left[0]], role), left[1])
+                if operator == "=":
+                    usage[left[0]].literals.append((left[1], literal))
+            continue
+        right = resolve(match.group(5), match.group(6))
+        for ref in (left, right):
+            if ref and left and right and left[0] != right[0]:
+                _add(usage[ref[0]].join, ref[1])
+
+    for match in _RANGE_OP.finditer(sql):
+        ref = resolve(match.group(1), match.group(2))
+        if ref:
+            _add(usage[ref[0]].range, ref[1])
+
+    for match in _IN.finditer(sql):
+        ref = resolve(match.group(1), match.group(2))
+        if ref:
+            _add(getattr(usage[ref[0]], "join" if match.group(3) else "eq"), ref[1])
+
+    clause_end = r"(?=\b(?:order\s+by|limit|offset|having|union)\b|\)|$)"
+    for clause in ("group", "order"):
+        for match in re.finditer(
+            rf"\b{clause}\s+by\s+(.*?){clause_end}", sql, re.IGNORECASE
+        ):
+            for ref in re.finditer(_REF, match.group(1)):
+                if ref.group(2).lower() in _KEYWORDS:
+                    continue
+                resolved = resolve(ref.group(1), ref.group(2))
+                if resolved:
+                    _add(usage[resolved[0]].order, resolved[1])
+
+    select = re.match(r"\s*select\s+(?:distinct\s+)?(.*?)\s+from\s", sql, re.I | re.S)
+    if select:
+        select_list = re.sub(r"\bas\s+\w+", "", select.group(1), flags=re.IGNORECASE)
+        if re.search(r"(^|[\s,.])\*", select_list):
+            for table in tables:
+                usage[table].select_all = True
+        for ref in re.finditer(rf"{_REF}(?!\s*\()", select_list):
+            resolved = resolve(ref.group(1), ref.group(2))
+            if resolved:
+                _add(usage[resolved[0]].select, resolved[1])
+
+    return usage
+
+
+# ========== CANDIDATES ==========
+
+
+@dataclass(frozen=True)
+class Candidate:
+    table: str
+    columns: tuple
+    method: str = "btree"
+    include: tuple = ()
+    where: str | None = None
+    kind: str = field(default="single", compare=False)
+
+    @property
+    def name(self) -> str:
+        suffix = {"brin": "_brin", "covering": "_cov", "partial": "_part"}
+        name = f"idx_{self.table}_{'_'.join(self.columns)}{suffix.get(self.kind, '')}"
+        return name[:63]
+
+    def ddl(self, table: str | None = None, name: str | None = None) -> str:
+        sql = (
+            f"CREATE INDEX {name or self.name} ON {table or self.table} "
+            f"USING {self.method} ({', '.join(self.columns)})"
+        )
+        if self.include:
+            sql += f" INCLUDE ({', '.join(self.include)})"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        return sql
+
+
+def _is_served(catalog: dict, table: str, columns: tuple, method: str) -> bool:
+    """An existing index of the same method starts with `columns`."""
+    for index in catalog["indexes"].get(table, []):
+        keys = index["columns"]
+        if index["method"] == method and tuple(keys[: len(columns)]) == columns:
+            return True
+    return False
+
+
+def _leads_index(catalog: dict, table: str, column: str) -> bool:
+    return any(
+        index["columns"][:1] == [column] for index in catalog["indexes"].get(table, [])
+    )
+
+
+def _is_low_cardinality(catalog: dict, table: str, column: str) -> bool:
+    if catalog["columns"][table].get(column) == "boolean":
+        return True
+    n_distinct = catalog["stats"].get((table, column), {}).get("n_distinct")
+    return n_distinct is not None and 0 < n_distinct <= LOW_CARDINALITY
+
+
+def candidates_for(table: str, use: TableUsage, catalog: dict) -> list[Candidate]:
+    types = catalog["columns"][table]
+    low_card = [col for col in use.eq if _is_low_cardinality(catalog, table, col)]
+    eq = [col for col in use.eq if col not in low_card]
+    # join columns that do not already lead an index come first
+    join = sorted(
+        (col for col in use.join if col not in eq),
+        key=lambda col: _leads_index(catalog, table, col),
+    )
+    ranges = [col for col in use.range if col not in eq and col not in join]
+    candidates = []
+
+    for col in eq + join + ranges:
+        candidates.append(Candidate(table, (col,)))
+
+    key = tuple(eq + join + ranges[:1])
+    if len(key) >= 2:
+        candidates.append(Candidate(table, key, kind="composite"))
+
+    if key and not use.select_all:
+        include = tuple(
+            dict.fromkeys(col for col in use.select + use.order if col not in key)
+        )
+        if 0 < len(include) <= MAX_INCLUDE:
+            candidates.append(Candidate(table, key, include=include, kind="covering"))
+
+    for col, literal in use.literals:
+        if col in low_card and literal.lower() not in ("%s",) and "%(" not in literal:
+            partial_key = key or tuple(use.order[:1])
+            if partial_key:
+                candidates.append(
+                    Candidate(
+                        table, partial_key, where=f"{col} = {literal}", kind="partial"
+                    )
+                )
+
+    for col in use.range + use.eq + use.order:
+        if types.get(col) in TIME_TYPES:
+            candidates.append(Candidate(table, (col,), method="brin", kind="brin"))
+
+    return [
+        candidate
+        for candidate in candidates
+        if candidate.where
+        or candidate.include
+        or not _is_served(catalog, table, candidate.columns, candidate.method)
+    ]
+
+
+def generate_candidates(workload: list[dict], catalog: dict) -> dict:
+    """Candidate -> names of the workload queries it was proposed for."""
+    proposals = {}
+    for query in workload:
+        query["usage"] = analyze_query(query["sql"], catalog)
+        for table, use in query["usage"].items():
+            for candidate in candidates_for(table, use, catalog):
+                known = next((c for c in proposals if c == candidate), candidate)
+                proposals.setdefault(known, []).append(query["name"])
+    return proposals
+
+
+# ========== BENCHMARK ==========
+
+
+def measure_query(conn, query: dict, config: BenchConfig) -> dict:
+    """Server-side time (p50) and plan of `query`; `timeout` if it was cancelled."""
+    plans = []
+
+    def sample():
+        with conn.cursor() as cur:
+            cur.execute(
+                f"EXPLAIN (ANALYZE, FORMAT JSON) {query['sql']}", query["params"]
+            )
+            plan = normalize_postgres_plan(cur.fetchone()[0])
+        plans.append(plan)
+        return plan["execution_time_ms"]
+
+    try:
+        stats = run_benchmark(sample, config)
+    except errors.QueryCanceled:
+        return {"p50_ms": None, "timeout": True, "indexes": []}
+    return {
+        "p50_ms": stats["p50_ms"],
+        "timeout": False,
+        "indexes": plans[-1]["indexes"],
+    }
+
+
+def create_index(conn, candidate: Candidate) -> dict:
+    with conn.cursor() as cur:
+        start = time.perf_counter_ns()
+        cur.execute(candidate.ddl())
+        build_ms = (time.perf_counter_ns() - start) / 1e6
+        cur.execute(f"ANALYZE {candidate.table}")
+        cur.execute("SELECT pg_relation_size(%s::regclass)", (candidate.name,))
+        size = cur.fetchone()[0]
+    return {"build_ms": build_ms, "size_mb": size / (1024 * 1024)}
+
+
+def drop_index(conn, name: str) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def measure_bulk_insert(
+    conn, table: str, rows: int, config: BenchConfig, candidate=None
+) -> float:
+    """p50 (ms) of inserting `rows` rows of `table` into a temp copy of it.
+
+    The copy has the current indexes of `table`, plus `candidate` if given.
+    Everything runs in one transaction that is rolled back: the temp tables
+    never outlive it, which a transaction-mode pooler (Supabase, port 6543)
+    requires since the next transaction may run on another backend.
+    """
+    target, source = f"advisor_write_{table}", f"advisor_source_{table}"
+    with conn.cursor() as cur:
+        cur.execute("BEGIN")
+        try:
+            cur.execute(
+                f"CREATE TEMP TABLE {target} "
+                f"(LIKE {table} INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP"
+            )
+            cur.execute(
+                f"CREATE TEMP TABLE {source} ON COMMIT DROP AS "
+                f"SELECT * FROM {table} LIMIT %s",
+                (rows,),
+            )
+            if candidate is not None:
+                cur.execute(
+                    candidate.ddl(table=target, name=f"{candidate.name[:55]}_w")
+                )
+
+            def sample():
+                cur.execute(f"TRUNCATE {target}")
+                start = time.perf_counter_ns()
+                cur.execute(f"INSERT INTO {target} SELECT * FROM {source}")
+                return (time.perf_counter_ns() - start) / 1e6
+
+            return run_benchmark(sample, config)["p50_ms"]
+        finally:
+            cur.execute("ROLLBACK")
+
+
+def evaluate(
+    conn,
+    workload: list[dict],
+    proposals: dict,
+    catalog: dict,
+    config: BenchConfig,
+    write_rows: int,
+    writes_per_run: float,
+    statement_timeout_ms: int,
+) -> list[dict]:
+    """Benchmark every candidate; return one result dict per candidate, ranked."""
+    with conn.cursor() as cur:
+        cur.execute(f"SET statement_timeout = {int(statement_timeout_ms)}")
+
+    print("Baseline...")
+    baseline = {}
+    for query in workload:
+        baseline[query["name"]] = measure_query(conn, query, config)
+        print(f"  {query['name']}: {_format_ms(baseline[query['name']])}")
+
+    write_baseline = {}
+    results = []
+    for candidate, proposed_for in proposals.items():
+        print(f"\n{candidate.ddl()}")
+        table = candidate.table
+        affected = [query for query in workload if table in query["usage"]]
+        try:
+            if table not in write_baseline:
+                write_baseline[table] = measure_bulk_insert(
+                    conn, table, write_rows, config
+                )
+            build = create_index(conn, candidate)
+            timings = {q["name"]: measure_query(conn, q, config) for q in affected}
+            drop_index(conn, candidate.name)
+            write_ms = measure_bulk_insert(conn, table, write_rows, config, candidate)
+        except errors.Error as e:
+            print(f"  skipped: {str(e).strip()}")
+            continue
+        finally:
+            drop_index(conn, candidate.name)
+
+        benefit_ms = 0.0
+        used_by = []
+        for query in affected:
+            before, after = baseline[query["name"]], timings[query["name"]]
+            used = candidate.name in after["indexes"]
+            print(
+                f"  {query['name']}: {_format_ms(before)} -> {_format_ms(after)}"
+                f"{' (uses index)' if used else ''}"
+            )
+            # queries whose plan ignores the index only add noise
+            if not used:
+                continue
+            used_by.append(query["name"])
+            # a timed-out query counts as taking the whole statement_timeout
+            before_ms = before["p50_ms"] or statement_timeout_ms
+            after_ms = after["p50_ms"] or statement_timeout_ms
+            benefit_ms += query["weight"] * (before_ms - after_ms)
+
+        base_write_ms = write_baseline[table]
+        penalty_ms = write_ms - base_write_ms
+        correlation = None
+        if candidate.method == "brin":
+            column_stats = catalog["stats"].get((table, candidate.columns[0]), {})
+            correlation = column_stats.get("correlation")
+        results.append(
+            {
+                "index": candidate.ddl(),
+                "name": candidate.name,
+                "kind": candidate.kind,
+                "table": table,
+                "proposed_for": proposed_for,
+                "used_by": used_by,
+                "benefit_ms": benefit_ms,
+                "write_penalty_ms": penalty_ms,
+                "write_penalty_pct": (
+                    penalty_ms / base_write_ms if base_write_ms else None
+                ),
+                "net_ms": benefit_ms - writes_per_run * penalty_ms,
+                "correlation": correlation,
+                **build,
+            }
+        )
+        print(
+            f"  saved {benefit_ms:.2f} ms/run, write +{penalty_ms:.2f} ms "
+            f"per {write_rows} rows, {build['size_mb']:.1f} MB"
+        )
+
+    with conn.cursor() as cur:
+        cur.execute("RESET statement_timeout")
+    results.sort(key=lambda result: result["net_ms"], reverse=True)
+    return results
+
+
+def _format_ms(measure: dict) -> str:
+    return "timeout" if measure["timeout"] else f"{measure['p50_ms']:.2f} ms"
+
+
+def print_ranking(results: list[dict]) -> None:
+    print("\n" + "=" * 70)
+    print("RANKED RECOMMENDATIONS (net = saved ms per workload run - write penalty)")
+    print("=" * 70)
+    for rank, result in enumerate(results, 1):
+        recommended = result["used_by"] and result["net_ms"] > 0
+        print(
+            f"{rank:>2}. {'*' if recommended else ' '} {result['net_ms']:>10.2f} ms  "
+            f"{result['index']}"
+        )
+        details = (
+            f"      saved {result['benefit_ms']:.2f} ms, write "
+            f"+{result['write_penalty_ms']:.2f} ms"
+        )
+        if result["write_penalty_pct"] is not None:
+            details += f" ({result['write_penalty_pct']:+.0%})"
+        details += (
+            f", {result['size_mb']:.1f} MB, built in {result['build_ms']:.0f} ms, "
+            f"used by: {', '.join(result['used_by']) or 'none'}"
+        )
+        if result["correlation"] is not None:
+            details += f", correlation {result['correlation']:.2f}"
+        print(details)
+    print("\n* = used by the planner and a net gain")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Propose, benchmark and rank Postgres indexes for a workload"
+    )
+    parser.add_argument("--env", default=None, help="Path to .env file")
+    parser.add_argument(
+        "--postgres-url", default=None, help="Postgres URL (overrides .env)"
+    )
+    parser.add_argument(
+        "--workload",
+        action="append",
+        default=None,
+        help="Workload file (.sql or scenarios .yaml); repeatable. Default: Tp1_postgres/Selects.sql",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only print the parsed usage and the candidates",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Untimed runs of each query"
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=5, help="Timed runs of each query"
+    )
+    parser.add_argument(
+        "--statement-timeout",
+        type=int,
+        default=30000,
+        help="Per-query timeout in ms; a timed-out query counts as this long",
+    )
+    parser.add_argument(
+        "--write-rows",
+        type=int,
+        default=10000,
+        help="Rows bulk-inserted to measure the write penalty",
+    )
+    parser.add_argument(
+        "--writes-per-run",
+        type=float,
+        default=1.0,
+        help="Bulk inserts of --write-rows rows per workload run, for the net score",
+    )
+    parser.add_argument("--output", default=None, help="Write the ranking as JSON")
+    args = parser.parse_args()
+
+    load_env(args.env)
+    workload = []
+    for path in args.workload or [DEFAULT_WORKLOAD]:
+        workload.extend(load_workload(path))
+    if not workload:
+        raise SystemExit("No query found in the workload")
+
+    conn = get_pg_connection(args.postgres_url)
+    try:
+        conn.autocommit = True
+        catalog = load_catalog(conn)
+        proposals = generate_candidates(workload, catalog)
+        for query in [q for q in workload if not q["usage"]]:
+            print(f"Skipping {query['name']}: no table of this database")
+            workload.remove(query)
+
+        for query in workload:
+            print(f"{query['name']}: {query['sql']}")
+            for table, use in query["usage"].items():
+                roles = {k: v for k, v in asdict(use).items() if v and k != "literals"}
+                print(f"  {table}: {roles}")
+        print(f"\n{len(proposals)} candidate indexes:")
+        for candidate, proposed_for in proposals.items():
+            print(
+                f"  [{candidate.kind}] {candidate.ddl()}  <- {', '.join(proposed_for)}"
+            )
+        if args.dry_run or not proposals:
+            return
+
+        config = BenchConfig(warmup=args.warmup, iterations=args.iterations)
+        results = evaluate(
+            conn,
+            workload,
+            proposals,
+            catalog,
+            config,
+            args.write_rows,
+            args.writes_per_run,
+            args.statement_timeout,
+        )
+        print_ranking(results)
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"Ranking written to {args.output}")
+    finally:
+        conn.autocommit = False
+        release_pg_connection(conn, args.postgres_url)
+        close_all()
+
+
+if __name__ == "__main__":
+    main()
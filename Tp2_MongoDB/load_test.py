@@ -0,0 +1,379 @@
+"""Concurrent load generator for MongoDB and Postgres.
+
+For each concurrency level, `N` worker threads drive one backend with a mix
+of reads and writes (`--write-ratio`) on the ISS collection (MongoDB) or the
+`mongo_import` table (Postgres):
+
+- closed loop (default): every worker sends its next operation as soon as the
+  previous one returns, which measures the maximum throughput;
+- open loop (`--qps`): operations are scheduled at a fixed total rate and
+  latency is measured from the scheduled start, so time spent queued behind a
+  saturated server is counted (no coordinated omission).
+
+Latencies go into HDR-style histograms per level and operation type. The
+saturation point is the level where throughput stops growing while p99 climbs.
+Both drivers release the GIL while waiting on the server, so threads are
+enough to load the databases; start several copies for more client CPU.
+
+Rows and documents written by the test carry `message = "loadtest"` and are
+deleted at the end unless `--keep-writes` is given.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+from bson import ObjectId
+
+from benchmark import LatencyHistogram
+from connexion import (
+    close_all,
+    get_collection,
+    get_pg_connection,
+    load_env,
+    release_pg_connection,
+)
+from import_donnes_mogo_to_postgres import id_to_pg, table_id_type
+
+LOAD_MESSAGE = "loadtest"
+
+
+# ========== OPERATIONS ==========
+
+
+def random_position(rng: random.Random) -> tuple[float, float]:
+    return rng.uniform(-90, 90), rng.uniform(-180, 180)
+
+
+class MongoOps:
+    def __init__(self, collection, read_limit: int):
+        self.collection = collection
+        self.read_limit = read_limit
+
+    def read(self, rng: random.Random) -> None:
+        lat, _ = random_position(rng)
+        query = {"iss_position.lattitude": {"$gt": lat}}
+        list(self.collection.find(query, limit=self.read_limit))
+
+    def write(self, rng: random.Random) -> None:
+        lat, lon = random_position(rng)
+        self.collection.insert_one(
+            {
+                "message": LOAD_MESSAGE,
+                "timestamp": int(time.time()),
+                "iss_position": {"lattitude": lat, "longitude": lon},
+            }
+        )
+
+    def release(self) -> None:
+        pass
+
+    def cleanup(self) -> int:
+        return self.collection.delete_many({"message": LOAD_MESSAGE}).deleted_count
+
+
+class PostgresOps:
+    """Each worker thread uses its own pooled connection."""
+
+    def __init__(self, table: str, read_limit: int, pg_url: str | None = None):
+        self.table = table
+        self.read_limit = read_limit
+        self.pg_url = pg_url
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+        self._id_type = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = get_pg_connection(self.pg_url)
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def read(self, rng: random.Random) -> None:
+        lat, _ = random_position(rng)
+        conn = self._conn()
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT lattitude, longitude, timestamp FROM {self.table} "
+                "WHERE lattitude > %s LIMIT %s",
+                (lat, self.read_limit),
+            )
+            cur.fetchall()
+        conn.rollback()
+
+    def write(self, rng: random.Random) -> None:
+        lat, lon = random_position(rng)
+        conn = self._conn()
+        if self._id_type is None:
+            self._id_type = table_id_type(conn, self.table)
+        with conn.cursor() as cur:
+            cur.execute(
+                f"INSERT INTO {self.table} (id, message, timestamp, lattitude, longitude) "
+                "VALUES (%s, %s, now(), %s, %s)",
+                (id_to_pg(ObjectId(), self._id_type), LOAD_MESSAGE, lat, lon),
+            )
+        conn.commit()
+
+    def release(self) -> None:
+        """Give the connections of finished workers back to the pool."""
+        with self._lock:
+            for conn in self._conns:
+                conn.rollback()
+                release_pg_connection(conn, self.pg_url)
+            self._conns.clear()
+        self._local = threading.local()
+
+    def cleanup(self) -> int:
+        conn = get_pg_connection(self.pg_url)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"DELETE FROM {self.table} WHERE message = %s", (LOAD_MESSAGE,)
+                )
+                deleted = cur.rowcount
+            conn.commit()
+            return deleted
+        finally:
+            release_pg_connection(conn, self.pg_url)
+
+
+# ========== LOAD LOOP ==========
+
+
+def worker(
+    ops,
+    worker_id: int,
+    workers: int,
+    start: float,
+    duration: float,
+    write_ratio: float,
+    qps: float,
+    seed: int,
+    record_from: float,
+    result: dict,
+):
+    rng = random.Random(seed + worker_id)
+    reads, writes = LatencyHistogram(), LatencyHistogram()
+    errors = 0
+    deadline = start + duration
+    i = 0
+    while True:
+        if qps:
+            # worker k owns slots k, k + N, k + 2N, ... of the global schedule
+            scheduled = start + (worker_id + i * workers) / qps
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+            if scheduled >= deadline:
+                break
+        i += 1
+
+        is_write = rng.random() < write_ratio
+        try:
+            (ops.write if is_write else ops.read)(rng)
+        except Exception as e:
+            errors += 1
+            if errors == 1:
+                print(f"Worker {worker_id}: {type(e).__name__}: {e}")
+            continue
+        if scheduled >= record_from:
+            latency_ms = (time.perf_counter() - scheduled) * 1000
+            (writes if is_write else reads).record(latency_ms)
+
+    result.update(reads=reads, writes=writes, errors=errors)
+
+
+def run_level(
+    ops,
+    backend: str,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    write_ratio: float,
+    qps: float,
+    seed: int,
+) -> dict:
+    """Run one concurrency level; only operations after `warmup` are recorded."""
+    start = time.perf_counter()
+    record_from = start + warmup
+    results = [{} for _ in range(concurrency)]
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(
+                ops,
+                k,
+                concurrency,
+                start,
+                warmup + duration,
+                write_ratio,
+                qps,
+                seed,
+                record_from,
+                results[k],
+            ),
+        )
+        for k in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - record_from
+    ops.release()
+
+    reads, writes = LatencyHistogram(), LatencyHistogram()
+    for result in results:
+        reads.merge(result["reads"])
+        writes.merge(result["writes"])
+    ops_done = reads.count + writes.count
+    return {
+        "backend": backend,
+        "concurrency": concurrency,
+        "target_qps": qps or None,
+        "ops": ops_done,
+        "errors": sum(result["errors"] for result in results),
+        "throughput_ops_s": ops_done / elapsed if elapsed > 0 else 0.0,
+        "read": reads.summary(),
+        "write": writes.summary(),
+    }
+
+
+def print_level(level: dict) -> None:
+    def fmt(summary, key):
+        value = summary.get(key)
+        return f"{value:8.2f}" if value is not None else f"{'-':>8}"
+
+    read, write = level["read"], level["write"]
+    print(
+        f"{level['backend']:<9}{level['concurrency']:>8}{level['throughput_ops_s']:>10.1f}"
+        f"{level['errors']:>7}"
+        f"{fmt(read, 'p50_ms')}{fmt(read, 'p99_ms')}{fmt(read, 'p999_ms')}"
+        f"{fmt(write, 'p50_ms')}{fmt(write, 'p99_ms')}{fmt(write, 'p999_ms')}"
+    )
+
+
+def print_header() -> None:
+    print(
+        f"{'Backend':<9}{'Clients':>8}{'ops/s':>10}{'Errors':>7}"
+        f"{'R p50':>8}{'R p99':>8}{'R p99.9':>8}"
+        f"{'W p50':>8}{'W p99':>8}{'W p99.9':>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concurrent read/write load test for MongoDB and Postgres"
+    )
+    parser.add_argument("--env", help="Path to .env file", default=None)
+    parser.add_argument(
+        "--backend",
+        choices=["mongo", "postgres", "both"],
+        default="both",
+        help="Database(s) to load",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,2,4,8,16",
+        help="Comma-separated numbers of concurrent clients, one run per level",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Measured seconds per level"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=2.0,
+        help="Seconds run before measuring, per level",
+    )
+    parser.add_argument(
+        "--qps",
+        type=float,
+        default=0,
+        help="Open loop: total target operations per second (0 = closed loop)",
+    )
+    parser.add_argument(
+        "--write-ratio",
+        type=float,
+        default=0.1,
+        help="Fraction of operations that are inserts",
+    )
+    parser.add_argument(
+        "--read-limit", type=int, default=100, help="Rows/documents per read"
+    )
+    parser.add_argument(
+        "--table", default="mongo_import", help="Postgres table to read/write"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument(
+        "--keep-writes",
+        action="store_true",
+        help="Do not delete the rows/documents inserted by the test",
+    )
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    load_env(args.env)
+    levels = [int(n) for n in args.concurrency.split(",") if n.strip()]
+    if not levels or min(levels) < 1:
+        raise SystemExit("--concurrency needs positive integers")
+    if not 0 <= args.write_ratio <= 1:
+        raise SystemExit("--write-ratio must be between 0 and 1")
+
+    backends = {}
+    if args.backend in ("mongo", "both"):
+        backends["mongo"] = MongoOps(get_collection(), args.read_limit)
+    if args.backend in ("postgres", "both"):
+        # one pooled connection per worker thread
+        pool_max = max(int(os.getenv("PG_POOL_MAX", "10")), max(levels) + 1)
+        os.environ["PG_POOL_MAX"] = str(pool_max)
+        backends["postgres"] = PostgresOps(args.table, args.read_limit)
+
+    mode = f"open loop, {args.qps:g} ops/s" if args.qps else "closed loop"
+    print(
+        f"Load test ({mode}, {args.write_ratio:.0%} writes, "
+        f"{args.duration:g}s per level after {args.warmup:g}s warmup)"
+    )
+    print("Latencies in ms (R = reads, W = writes)\n")
+    print_header()
+
+    results = []
+    try:
+        for name, ops in backends.items():
+            for concurrency in levels:
+                level = run_level(
+                    ops,
+                    name,
+                    concurrency,
+                    args.duration,
+                    args.warmup,
+                    args.write_ratio,
+                    args.qps,
+                    args.seed,
+                )
+                results.append(level)
+                print_level(level)
+    finally:
+        if not args.keep_writes:
+            for name, ops in backends.items():
+                print(f"Deleted {ops.cleanup()} {name} test writes")
+        close_all()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Query plans of both engines in one common model, and plan diffs.
+
+`normalize_postgres_plan` takes the output of
+`EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` and `normalize_mongo_plan` the
+output of the `explain` command with `executionStats` verbosity. Both return:
+
+    {
+        "engine": "postgres" | "mongodb",
+        "scan_types": ["full_scan" | "index_scan" | "index_only_scan" | "bitmap_scan", ...],
+        "indexes": [index names used],
+        "rows_examined": rows/documents read by the scans,
+        "keys_examined": index keys read (MongoDB only),
+        "rows_returned": rows/documents returned by the plan,
+        "buffers_hit": shared buffer hits (Postgres only),
+        "buffers_read": shared buffers read from disk (Postgres only),
+        "execution_time_ms": server-side execution time,
+        "nodes": [{"depth", "operation", "scan_type", "relation", "index", "rows"}],
+    }
+"""
+
+import difflib
+
+_PG_SCAN_TYPES = {
+    "Seq Scan": "full_scan",
+    "Parallel Seq Scan": "full_scan",
+    "Index Scan": "index_scan",
+    "Index Only Scan": "index_only_scan",
+    "Bitmap Heap Scan": "bitmap_scan",
+    "Bitmap Index Scan": "bitmap_scan",
+}
+
+_MONGO_SCAN_TYPES = {
+    "COLLSCAN": "full_scan",
+    "IXSCAN": "index_scan",
+    "COUNT_SCAN": "index_only_scan",
+    "DISTINCT_SCAN": "index_only_scan",
+    "IDHACK": "index_scan",
+    "EXPRESS_IXSCAN": "index_scan",
+    "EXPRESS_CLUSTERED_IXSCAN": "index_scan",
+}
+
+PLAN_FIELDS = [
+    "scan_types",
+    "indexes",
+    "rows_examined",
+    "keys_examined",
+    "rows_returned",
+    "buffers_hit",
+    "buffers_read",
+    "execution_time_ms",
+]
+
+
+def _summary(engine: str, nodes: list[dict], **values) -> dict:
+    scan_types, indexes = [], []
+    for node in nodes:
+        if node["scan_type"] and node["scan_type"] not in scan_types:
+            scan_types.append(node["scan_type"])
+        if node["index"] and node["index"] not in indexes:
+            indexes.append(node["index"])
+    plan = {"engine": engine, "scan_types": scan_types, "indexes": indexes}
+    plan.update({field: None for field in PLAN_FIELDS[2:]})
+    plan.update(values)
+    plan["nodes"] = nodes
+    return plan
+
+
+# ========== POSTGRES ==========
+
+
+def normalize_postgres_plan(explain_json) -> dict:
+    """Normalize the single row returned by `EXPLAIN (..., FORMAT JSON)`."""
+    if isinstance(explain_json, list):
+        explain_json = explain_json[0]
+    root = explain_json["Plan"]
+    nodes = []
+    rows_examined = 0
+
+    def walk(node, depth):
+        nonlocal rows_examined
+        operation = node["Node Type"]
+        scan_type = _PG_SCAN_TYPES.get(operation)
+        loops = node.get("Actual Loops", 1) or 1
+        rows = node.get("Actual Rows", 0) * loops
+        # heap scans: kept rows + rows thrown away by the filter / recheck
+        if scan_type and operation != "Bitmap Index Scan":
+            removed = node.get("Rows Removed by Filter", 0)
+            removed += node.get("Rows Removed by Index Recheck", 0)
+            rows_examined += rows + removed * loops
+        nodes.append(
+            {
+                "depth": depth,
+                "operation": operation,
+                "scan_type": scan_type,
+                "relation": node.get("Relation Name"),
+                "index": node.get("Index Name"),
+                "rows": rows,
+            }
+        )
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    # buffer counters of the root node include all its children
+    return _summary(
+        "postgres",
+        nodes,
+        rows_examined=rows_examined,
+        rows_returned=root.get("Actual Rows"),
+        buffers_hit=root.get("Shared Hit Blocks"),
+        buffers_read=root.get("Shared Read Blocks"),
+        execution_time_ms=explain_json.get("Execution Time"),
+    )
+
+
+# ========== MONGODB ==========
+
+
+def _mongo_execution_stats(explain: dict) -> tuple[dict, dict]:
+    """(executionStats, queryPlanner) of a find or aggregate explain."""
+    if "executionStats" in explain:
+        return explain["executionStats"], explain.get("queryPlanner", {})
+    for stage in explain.get("stages", []):
+        cursor = stage.get("$cursor")
+        if cursor and "executionStats" in cursor:
+            return cursor["executionStats"], cursor.get("queryPlanner", {})
+    return {}, explain.get("queryPlanner", {})
+
+
+def _mongo_children(stage: dict) -> list[dict]:
+    children = []
+    if "inputStage" in stage:
+        children.append(stage["inputStage"])
+    children.extend(stage.get("inputStages", []))
+    if "queryPlan" in stage:
+        children.append(stage["queryPlan"])
+    return children
+
+
+def normalize_mongo_plan(explain: dict) -> dict:
+    """Normalize the output of `explain` with `executionStats` verbosity."""
+    stats, planner = _mongo_execution_stats(explain)
+    # classic engine: executionStages is the executed tree; with the slot-based
+    # engine the readable tree is queryPlanner.winningPlan.queryPlan
+    root = stats.get("executionStages") or {}
+    if "stage" not in root:
+        root = planner.get("winningPlan", {})
+    nodes = []
+
+    def walk(stage, depth):
+        if "stage" in stage:
+            name = stage["stage"]
+            nodes.append(
+                {
+                    "depth": depth,
+                    "operation": name,
+                    "scan_type": _MONGO_SCAN_TYPES.get(name),
+                    "relation": None,
+                    "index": stage.get("indexName"),
+                    "rows": stage.get("nReturned"),
+                }
+            )
+            depth += 1
+        for child in _mongo_children(stage):
+            walk(child, depth)
+
+    walk(root, 0)
+    return _summary(
+        "mongodb",
+        nodes,
+        rows_examined=stats.get("totalDocsExamined"),
+        keys_examined=stats.get("totalKeysExamined"),
+        rows_returned=stats.get("nReturned"),
+        execution_time_ms=stats.get("executionTimeMillis"),
+    )
+
+
+# ========== DISPLAY / DIFF ==========
+
+
+def format_plan(plan: dict) -> str:
+    """Plan tree, one indented line per node, followed by the summary."""
+    lines = []
+    for node in plan["nodes"]:
+        text = node["operation"]
+        if node["relation"]:
+            text += f" on {node['relation']}"
+        if node["index"]:
+            text += f" using {node['index']}"
+        if node["rows"] is not None:
+            text += f" (rows={node['rows']})"
+        lines.append("  " * node["depth"] + text)
+    summary = ", ".join(
+        f"{field}={_format_value(plan.get(field))}"
+        for field in PLAN_FIELDS
+        if plan.get(field) not in (None, [])
+    )
+    lines.append(summary)
+    return "\n".join(lines)
+
+
+def _format_value(value) -> str:
+    if isinstance(value, list):
+        return "+".join(value) or "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def diff_plans(before: dict, after: dict) -> list[dict]:
+    """Summary fields that differ between two plans of the same query."""
+    return [
+        {"field": field, "before": before.get(field), "after": after.get(field)}
+        for field in PLAN_FIELDS
+        if before.get(field) != after.get(field)
+    ]
+
+
+def format_plan_diff(before: dict, after: dict, labels=("before", "after")) -> str:
+    """Changed summary fields, then a unified diff of the two plan trees."""
+    lines = []
+    for change in diff_plans(before, after):
+        if change["field"] == "execution_time_ms":
+            continue  # always differs; shown by the benchmark itself
+        lines.append(
+            f"{change['field']}: {_format_value(change['before'])} -> "
+            f"{_format_value(change['after'])}"
+        )
+    tree_before = format_plan(before).splitlines()[:-1]
+    tree_after = format_plan(after).splitlines()[:-1]
+    lines.extend(
+        difflib.unified_diff(
+            tree_before, tree_after, fromfile=labels[0], tofile=labels[1], lineterm=""
+        )
+    )
+    return "\n".join(lines) if lines else "(plan unchanged)"
@@ -0,0 +1,368 @@
+"""Read-through cache for repeated query results (benchmarks, dashboards).
+
+Entries are keyed on the normalized query (SQL text with whitespace outside
+quotes and a trailing `;` collapsed, or a Mongo filter / pipeline serialized
+with sorted keys) plus its parameters, and tagged with the tables /
+collections they read (`sources`):
+
+- an in-process LRU of `maxsize` entries, each valid for `ttl` seconds;
+- optionally a SQLite file (`path`) shared by every process of the machine:
+  misses of the LRU are looked up there, and invalidations are visible to all
+  processes using the same file.
+
+Invalidation bumps a generation number per source; an entry is only served
+if the generations of its sources did not change since it was stored. The
+exporter calls `invalidate(table)` after each committed batch and the
+buffered Mongo writer `invalidate(mongo_source(collection))` (`db.collection`)
+after each flush, so a cached
+result never outlives the data it was computed from (in processes sharing
+the cache). Results with more than `max_rows` rows are not cached.
+
+`get_cache()` returns the process-wide cache configured by
+`QUERY_CACHE_SIZE` (256), `QUERY_CACHE_TTL` (60 s), `QUERY_CACHE_MAX_ROWS`
+(10000) and `QUERY_CACHE_PATH` (unset = memory only). Values are pickled in
+the SQLite file: only point `QUERY_CACHE_PATH` at a file you trust.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from bson import json_util
+
+COUNTERS = [
+    "hits",
+    "disk_hits",
+    "misses",
+    "expired",
+    "stale",
+    "evictions",
+    "too_large",
+    "invalidations",
+]
+
+
+# quoted parts of a SQL text, kept as is by normalize_query
+_SQL_QUOTED = re.compile(
+    r"(?<!\w)[eE]'(?:[^'\\]|''|\\.)*'"  # E'...' (backslash escapes)
+    r"|'(?:[^']|'')*'"  # '...'
+    r'|"(?:[^"]|"")*"'  # "identifier"
+    r"|\$(\w*)\$.*?\$\1\$",  # $tag$...$tag$
+    re.DOTALL,
+)
+
+
+def normalize_query(query) -> str:
+    """Same text for queries that differ only by spacing or key order.
+
+    In SQL, whitespace is only collapsed outside literals and quoted
+    identifiers: `'a  b'` and `'a b'` are different queries.
+    """
+    if isinstance(query, str):
+        parts, end = [], 0
+        for match in _SQL_QUOTED.finditer(query):
+            parts += [re.sub(r"\s+", " ", query[end : match.start()]), match.group()]
+            end = match.end()
+        parts.append(re.sub(r"\s+", " ", query[end:]))
+        return "".join(parts).strip().rstrip(";").strip()
+    return json_util.dumps(query, sort_keys=True)
+
+
+def cache_key(query, params=None) -> str:
+    params_text = json_util.dumps(params, sort_keys=True) if params else ""
+    text = f"{normalize_query(query)}\x00{params_text}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """LRU + TTL cache of query results, optionally backed by a SQLite file."""
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 60.0,
+        path: str | None = None,
+        max_rows: int | None = 10000,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.max_rows = max_rows
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # key -> (expires_at, {source: generation}, value)
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.RLock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    generations TEXT NOT NULL,
+                    value BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS generations (
+                    source TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                );
+                """)
+            self._db.commit()
+
+    # ----- generations -----
+
+    def _current(self, sources) -> dict:
+        if self._db is None or not sources:
+            return {source: self._generations.get(source, 0) for source in sources}
+        rows = dict(
+            self._db.execute(
+                "SELECT source, generation FROM generations WHERE source IN "
+                f"({', '.join('?' * len(sources))})",
+                list(sources),
+            ).fetchall()
+        )
+        return {source: rows.get(source, 0) for source in sources}
+
+    def generations(self) -> dict:
+        """Current generation of every invalidated source."""
+        with self._lock:
+            if self._db is None:
+                return dict(self._generations)
+            return dict(self._db.execute("SELECT source, generation FROM generations"))
+
+    def invalidate(self, source: str) -> None:
+        """Every cached result that read `source` is stale from now on."""
+        with self._lock:
+            self.counters["invalidations"] += 1
+            self._generations[source] = self._generations.get(source, 0) + 1
+            for key in [
+                key for key, entry in self._entries.items() if source in entry[1]
+            ]:
+                del self._entries[key]
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO generations VALUES (?, 1) ON CONFLICT (source) "
+                    "DO UPDATE SET generation = generation + 1",
+                    (source,),
+                )
+                self._db.commit()
+
+    # ----- entries -----
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            now = time.time()
+            # expired / stale are counted once per lookup, even when both the
+            # memory and the disk copy of the entry are rejected
+            rejected = None
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, generations, value = entry
+                if expires_at <= now:
+                    rejected = "expired"
+                elif generations != self._current(generations):
+                    rejected = "stale"
+                else:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, generations, value FROM entries WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    expires_at, generations = row[0], json.loads(row[1])
+                    if expires_at > now and generations == self._current(generations):
+                        value = pickle.loads(row[2])
+                        self._store(key, expires_at, generations, value)
+                        self.counters["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                    rejected = rejected or ("expired" if expires_at <= now else "stale")
+
+            if rejected:
+                self.counters[rejected] += 1
+            self.counters["misses"] += 1
+            return default
+
+    def _store(self, key, expires_at, generations, value) -> None:
+        self._entries[key] = (expires_at, generations, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def put(
+        self, key: str, value, sources=(), ttl: float | None = None, generations=None
+    ) -> bool:
+        """Store `value` (False if larger than `max_rows` rows).
+
+        `generations`: those of `sources` when the value was computed (default:
+        now); an invalidation in between makes the entry stale right away.
+        """
+        if self.max_rows is not None and len(value) > self.max_rows:
+            self.counters["too_large"] += 1
+            return False
+        with self._lock:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+            if generations is None:
+                generations = self._current(tuple(sources))
+            self._store(key, expires_at, generations, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    (key, expires_at, json.dumps(generations), pickle.dumps(value)),
+                )
+                self._db.commit()
+        return True
+
+    def get_or_compute(self, query, params, compute, sources=(), ttl=None):
+        """Cached result of `query` / `params`, else `compute()` (stored)."""
+        key = cache_key(query, params)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            with self._lock:
+                generations = self._current(tuple(sources))
+            value = compute()
+            self.put(key, value, sources, ttl, generations)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Counters, hit ratio and number of entries in memory / on disk."""
+        with self._lock:
+            stats = dict(self.counters)
+            lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_ratio"] = (
+                (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            )
+            stats["entries"] = len(self._entries)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(
+                    "SELECT COUNT(*) FROM entries"
+                ).fetchone()[0]
+            return stats
+
+
+# ========== SHARED CACHE ==========
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> QueryCache:
+    """Process-wide cache configured by the QUERY_CACHE_* variables."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_rows = int(os.getenv("QUERY_CACHE_MAX_ROWS", "10000"))
+            _cache = QueryCache(
+                maxsize=int(os.getenv("QUERY_CACHE_SIZE", "256")),
+                ttl=float(os.getenv("QUERY_CACHE_TTL", "60")),
+                path=os.getenv("QUERY_CACHE_PATH") or None,
+                max_rows=max_rows or None,
+            )
+    return _cache
+
+
+def invalidate(source: str) -> None:
+    """Invalidation hook for writers: results read from `source` are stale."""
+    get_cache().invalidate(source)
+
+
+def cached_fetchall(conn, sql: str, params=None, sources=(), cache=None, ttl=None):
+    """`cursor.fetchall()` of `sql` through the cache (`get_cache()` by default)."""
+
+    def fetch():
+        with conn.cursor() as cur:
+            cur.execute(sql, params or None)
+            return cur.fetchall()
+
+    return (cache or get_cache()).get_or_compute(sql, params, fetch, sources, ttl)
+
+
+def mongo_source(collection) -> str:
+    """Source name of a Mongo collection: `db.collection`, so that same-named
+    collections of two databases neither share results nor invalidations."""
+    return f"{collection.database.name}.{collection.name}"
+
+
+def cached_find(collection, query_filter=None, cache=None, ttl=None) -> list:
+    """`list(collection.find(query_filter))` through the cache."""
+    query_filter = query_filter or {}
+    source = mongo_source(collection)
+    return (cache or get_cache()).get_or_compute(
+        {"find": source, "filter": query_filter},
+        None,
+        lambda: list(collection.find(query_filter)),
+        (source,),
+        ttl,
+    )
+
+
+def cached_aggregate(collection, pipeline, cache=None, ttl=None) -> list:
+    """`list(collection.aggregate(pipeline))` through the cache."""
+    source = mongo_source(collection)
+    return (cache or get_cache()).get_or_compute(
+        {"aggregate": source, "pipeline": pipeline},
+        None,
+        lambda: list(collection.aggregate(pipeline)),
+        (source,),
+        ttl,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or invalidate the shared query cache (QUERY_CACHE_PATH)"
+    )
+    parser.add_argument(
+        "--path",
+        default=os.getenv("QUERY_CACHE_PATH"),
+        help="SQLite cache file (default: QUERY_CACHE_PATH)",
+    )
+    parser.add_argument(
+        "--invalidate",
+        action="append",
+        default=[],
+        metavar="SOURCE",
+        help="Mark the results read from this table or db.collection stale "
+        "(repeatable)",
+    )
+    parser.add_argument("--clear", action="store_true", help="Drop every entry")
+    args = parser.parse_args()
+    if not args.path:
+        raise SystemExit("No cache file: pass --path or set QUERY_CACHE_PATH")
+
+    cache = QueryCache(path=args.path)
+    for source in args.invalidate:
+        cache.invalidate(source)
+    if args.clear:
+        cache.clear()
+    print(f"{cache.stats()['disk_entries']} entries in {args.path}")
+    for source, generation in sorted(cache.generations().items()):
+        print(f"  {source}: generation {generation}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Retry and counting rules of `BufferedMongoWriter._insert_with_retry`."""
+
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError, WriteError
+
+import buffered_writer
+from buffered_writer import DUPLICATE_KEY, BufferedMongoWriter
+
+
+class Result:
+    def __init__(self, docs):
+        self.inserted_ids = [doc["_id"] for doc in docs]
+
+
+class FakeCollection:
+    """insert_many raises the queued errors, then inserts."""
+
+    name = "iss"
+    database = SimpleNamespace(name="tp2")
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def insert_many(self, docs, ordered=False):
+        self.calls.append(list(docs))
+        if self.errors:
+            raise self.errors.pop(0)
+        return Result(docs)
+
+
+def bulk_error(n_inserted, *codes, labels=()):
+    details = {
+        "nInserted": n_inserted,
+        "writeErrors": [
+            {"index": i, "code": code, "errmsg": "error"}
+            for i, code in enumerate(codes)
+        ],
+    }
+    if labels:
+        details["errorLabels"] = list(labels)
+    return BulkWriteError(details)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(buffered_writer.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(buffered_writer, "invalidate", lambda source: None)
+
+
+def docs(count):
+    return [{"_id": i} for i in range(count)]
+
+
+def test_negative_retries_rejected():
+    with pytest.raises(ValueError):
+        BufferedMongoWriter(FakeCollection(), retries=-1)
+
+
+def test_transient_error_is_retried():
+    coll = FakeCollection(AutoReconnect("primary stepped down"))
+    writer = BufferedMongoWriter(coll, retries=2)
+
+    assert writer._insert_with_retry(docs(3)) == (3, 0)
+    assert len(coll.calls) == 2
+
+
+def test_validation_error_is_not_retried():
+    # 1st doc fails validation (121), the 2 others are inserted
+    coll = FakeCollection(bulk_error(2, 121))
+    writer = BufferedMongoWriter(coll, retries=3)
+
+    assert writer._insert_with_retry(docs(3)) == (2, 0)
+    assert len(coll.calls) == 1
+
+
+def test_non_bulk_error_is_not_retried():
+    coll = FakeCollection(WriteError("document failed validation", code=121))
+    writer = BufferedMongoWriter(coll, retries=3)
+
+    assert writer._insert_with_retry(docs(2)) == (0, 0)
+    assert len(coll.calls) == 1
+
+
+def test_duplicates_are_not_counted_as_inserted():
+    coll = FakeCollection(bulk_error(1, DUPLICATE_KEY, DUPLICATE_KEY))
+    writer = BufferedMongoWriter(coll, max_items=None)
+    for doc in docs(3):
+        writer.add(doc)
+
+    writer.flush()
+
+    assert (writer.inserted, writer.duplicates, writer.failed) == (1, 2, 0)
+
+
+def test_retryable_bulk_error_retries_only_failed_documents():
+    coll = FakeCollection(bulk_error(1, 91, labels=["RetryableWriteError"]))
+    writer = BufferedMongoWriter(coll, retries=1)
+
+    assert writer._insert_with_retry(docs(2)) == (2, 0)
+    assert coll.calls[1] == [{"_id": 0}]
@@ -0,0 +1,43 @@
+"""Level selection and duration parsing of `downsample`."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from downsample import local_timezone, parse_duration, pick_level
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.mark.parametrize(
+    "text, seconds",
+    [("90", 90), ("90s", 90), ("15m", 900), ("6h", 21600), ("7d", 604800)],
+)
+def test_parse_duration(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+def test_parse_duration_rejects_unknown_unit():
+    with pytest.raises(ValueError):
+        parse_duration("3w")
+
+
+@pytest.mark.parametrize(
+    "span, resolution, level",
+    [
+        (timedelta(days=7), 3600, "1h"),  # 168 points
+        (timedelta(days=7), 7200, "1h"),  # coarsest level still fine enough
+        (timedelta(days=365), 86400, "1d"),
+        (timedelta(days=1), 60, "1min"),
+        (timedelta(hours=1), 30, None),  # below 1 min: raw samples
+        (timedelta(seconds=30), 3600, None),  # range shorter than any bucket
+        (timedelta(hours=2), 86400, "1h"),  # a 1d bucket would exceed the range
+    ],
+)
+def test_pick_level(span, resolution, level):
+    assert pick_level(START, START + span, resolution) == level
+
+
+def test_local_timezone_from_tz(monkeypatch):
+    monkeypatch.setenv("TZ", ":Europe/Paris")
+    assert local_timezone() == "Europe/Paris"
@@ -0,0 +1,109 @@
+"""`follow_changes` against a mocked change stream (no replica set needed)."""
+
+from bson import ObjectId
+
+import import_donnes_mogo_to_postgres as exporter
+
+
+class FakeStream:
+    """Change stream yielding `changes`, then closing (`alive` = False)."""
+
+    def __init__(self, changes):
+        self._changes = list(changes)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def alive(self):
+        return bool(self._changes)
+
+    def try_next(self):
+        token, document = self._changes.pop(0)
+        self.resume_token = token
+        return {"operationType": "insert", "fullDocument": document}
+
+
+class FakeCollection:
+    def __init__(self, changes):
+        self.name = "iss"
+        self.database = type("Database", (), {"name": "tp2"})()
+        self.changes = changes
+        self.watch_calls = []
+
+    def watch(self, pipeline, resume_after=None, max_await_time_ms=None):
+        self.watch_calls.append(resume_after)
+        return FakeStream(self.changes)
+
+
+def make_changes(start, count):
+    return [
+        (
+            {"_data": f"token-{i}"},
+            {
+                "_id": ObjectId(),
+                "message": "success",
+                "timestamp": 1700000000 + i,
+                "iss_position": {"latitude": "1.5", "longitude": "2.5"},
+            },
+        )
+        for i in range(start, start + count)
+    ]
+
+
+def patch_postgres(monkeypatch, saved):
+    """Checkpoint table in memory, inserter that commits each batch at once."""
+
+    def load_resume_token(conn, table_name, scope=("", "")):
+        return saved["token"] if saved else None
+
+    def save_checkpoint(cur, table_name, rows, resume_token=None, scope=("", "")):
+        saved.update(token=resume_token, last_id=rows[-1][0], scope=scope)
+        saved.setdefault("batches", []).append((len(rows), resume_token))
+
+    def make_inserter(conn, table_name, mode, before_commit=None):
+        def insert(rows):
+            before_commit(None, rows)
+            return len(rows)
+
+        return insert
+
+    monkeypatch.setattr(exporter, "load_resume_token", load_resume_token)
+    monkeypatch.setattr(exporter, "save_checkpoint", save_checkpoint)
+    monkeypatch.setattr(exporter, "make_inserter", make_inserter)
+
+
+def test_resume_token_saved_with_each_batch(monkeypatch):
+    saved = {}
+    patch_postgres(monkeypatch, saved)
+    coll = FakeCollection(make_changes(0, 5))
+
+    total = exporter.follow_changes(coll, None, "mongo_import", flush_rows=2)
+
+    assert total == 5
+    assert coll.watch_calls == [None]
+    # two full batches, then the rest flushed on exit, each with its token
+    assert saved["batches"] == [
+        (2, {"_data": "token-1"}),
+        (2, {"_data": "token-3"}),
+        (1, {"_data": "token-4"}),
+    ]
+    assert saved["last_id"] == str(coll.changes[-1][1]["_id"])
+    assert saved["scope"] == ("tp2.iss", "")
+
+
+def test_restart_resumes_after_saved_token(monkeypatch):
+    saved = {}
+    patch_postgres(monkeypatch, saved)
+    exporter.follow_changes(FakeCollection(make_changes(0, 3)), None, "t", flush_rows=2)
+
+    restarted = FakeCollection(make_changes(3, 2))
+    total = exporter.follow_changes(restarted, None, "t", flush_rows=2)
+
+    assert restarted.watch_calls == [{"_data": "token-2"}]
+    assert total == 2
+    assert saved["token"] == {"_data": "token-4"}
@@ -0,0 +1,135 @@
+"""`poll_async` against a local aiohttp stub of the ISS API."""
+
+import asyncio
+import threading
+import time
+
+from aiohttp import web
+
+import fetch_store_query
+
+
+def run_with_stub(delay, coro_factory):
+    """Serve a stub API answering after `delay` s, run `coro_factory(url)`.
+
+    Returns (result, arrival times of the requests, max requests in flight).
+    """
+    state = {"arrivals": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def handler(request):
+        state["arrivals"].append(asyncio.get_running_loop().time())
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(delay)
+        state["in_flight"] -= 1
+        return web.json_response(
+            {"message": "success", "timestamp": int(time.time()), "iss_position": {}}
+        )
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/iss-now.json", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            return await coro_factory(f"http://127.0.0.1:{port}/iss-now.json")
+        finally:
+            await runner.cleanup()
+
+    result = asyncio.run(main())
+    return result, state["arrivals"], state["max_in_flight"]
+
+
+class SlowWriter:
+    """Stands in for BufferedMongoWriter: each add takes `delay` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.added = []
+        self._lock = threading.Lock()
+
+    def add(self, data):
+        time.sleep(self.delay)
+        with self._lock:
+            self.added.append(data)
+
+
+def test_fixed_rate_schedule_ignores_response_time():
+    # responses take 4 intervals: ticks must still start every interval
+    fetched, arrivals, _ = run_with_stub(
+        0.2, lambda url: fetch_store_query.poll_async([url], repeat=5, interval=0.05)
+    )
+
+    assert fetched == 5
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    assert all(0.03 <= gap <= 0.12 for gap in gaps), gaps
+    assert arrivals[-1] - arrivals[0] < 0.35
+
+
+def test_concurrency_is_bounded():
+    fetched, _, max_in_flight = run_with_stub(
+        0.1,
+        lambda url: fetch_store_query.poll_async(
+            [url] * 6, repeat=1, interval=0, concurrency=2
+        ),
+    )
+
+    assert fetched == 6
+    assert max_in_flight == 2
+
+
+def test_queue_backpressure_into_writer(monkeypatch):
+    sizes = []
+
+    class TrackingQueue(asyncio.Queue):
+        async def put(self, item):
+            await super().put(item)
+            sizes.append(self.qsize())
+
+    monkeypatch.setattr(fetch_store_query.asyncio, "Queue", TrackingQueue)
+    writer = SlowWriter(0.05)
+    started = time.perf_counter()
+    fetched, _, _ = run_with_stub(
+        0,
+        lambda url: fetch_store_query.poll_async(
+            [url] * 6, repeat=1, interval=0, writer=writer, queue_size=1
+        ),
+    )
+
+    assert fetched == 6
+    assert len(writer.added) == 6
+    # the fetchers waited for the writer instead of queueing everything
+    assert max(sizes) <= 1
+    assert time.perf_counter() - started >= 6 * 0.05
+
+
+def test_pending_tasks_are_bounded(monkeypatch):
+    # the API is 10x slower than the interval: ticks wait for a free slot
+    state = {"pending": 0, "max_pending": 0}
+    poll_endpoint = fetch_store_query.poll_endpoint
+
+    def tracked(*args):
+        state["pending"] += 1
+        state["max_pending"] = max(state["max_pending"], state["pending"])
+
+        async def run():
+            try:
+                await poll_endpoint(*args)
+            finally:
+                state["pending"] -= 1
+
+        return run()
+
+    monkeypatch.setattr(fetch_store_query, "poll_endpoint", tracked)
+    fetched, _, _ = run_with_stub(
+        0.1,
+        lambda url: fetch_store_query.poll_async(
+            [url], repeat=10, interval=0.01, concurrency=2
+        ),
+    )
+
+    assert fetched == 10
+    assert state["max_pending"] == 2
@@ -0,0 +1,60 @@
+"""`prepare_columns` must give exactly the rows of `prepare_row`."""
+
+import time
+
+import pytest
+from bson import ObjectId
+
+from import_donnes_mogo_to_postgres import (
+    prepare_columns,
+    prepare_row,
+    rows_from_columns,
+)
+
+TIMESTAMPS = [
+    1717000000,  # seconds
+    1717000000.25,
+    1717000000123,  # milliseconds
+    1717000000123.5,
+    "1717000000",  # integer strings
+    " 1717000000123 ",
+    "2024-05-29T18:26:40",  # ISO string
+    "not a date",
+    None,
+    True,
+    1e11,  # outside the vectorized range (year 5138)
+    # Europe/Paris DST changes: 2024-03-31 01:00 UTC and 2024-10-27 01:00 UTC,
+    # including fractions that round up across the change
+    1711846799,
+    1711846799.9999996,
+    1711846800,
+    1711846799999.9996,
+    1729990799,
+    1729990799.9999996,
+    1729990800,
+    1729994399.9999996,
+]
+
+
+@pytest.fixture(params=["Europe/Paris", "UTC"])
+def local_zone(request, monkeypatch):
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_same_rows_as_prepare_row(local_zone):
+    docs = [
+        {
+            "_id": ObjectId(),
+            "message": "success",
+            "timestamp": timestamp,
+            "iss_position": {"latitude": "12.5", "longitude": -3},
+        }
+        for timestamp in TIMESTAMPS
+    ]
+    docs.append({"_id": ObjectId()})  # no timestamp, no position
+
+    assert rows_from_columns(prepare_columns(docs)) == [prepare_row(d) for d in docs]
@@ -0,0 +1,78 @@
+"""Key normalization and counters of `query_cache.QueryCache`."""
+
+from types import SimpleNamespace
+
+from query_cache import (
+    QueryCache,
+    cache_key,
+    cached_find,
+    mongo_source,
+    normalize_query,
+)
+
+
+def test_whitespace_collapsed_outside_quotes():
+    assert normalize_query("SELECT  a,\n  b FROM t ;") == "SELECT a, b FROM t"
+
+
+def test_whitespace_kept_inside_quotes():
+    for left, right in [
+        ("SELECT 'a  b'", "SELECT 'a b'"),
+        ("SELECT 'it''s  x'", "SELECT 'it''s x'"),
+        ("SELECT E'a\\'  b'", "SELECT E'a\\' b'"),
+        ('SELECT "my  col" FROM t', 'SELECT "my col" FROM t'),
+        ("SELECT $$a  b$$", "SELECT $$a b$$"),
+    ]:
+        assert cache_key(left) != cache_key(right), left
+
+
+def test_mongo_query_key_order():
+    assert normalize_query({"a": 1, "b": 2}) == normalize_query({"b": 2, "a": 1})
+
+
+def test_stale_counted_once_with_disk(tmp_path):
+    cache = QueryCache(path=str(tmp_path / "cache.db"))
+    key = cache_key("SELECT 1")
+    cache.put(key, [(1,)], sources=("t",))
+    cache.invalidate("t")
+
+    assert cache.get(key) is None
+    assert (cache.counters["stale"], cache.counters["misses"]) == (1, 1)
+
+
+def test_fresh_disk_entry_after_stale_memory_entry(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache, other = QueryCache(path=path), QueryCache(path=path)
+    key = cache_key("SELECT 1")
+    cache.put(key, [(1,)], sources=("t",))
+    other.invalidate("t")
+    other.put(key, [(2,)], sources=("t",))
+
+    assert cache.get(key) == [(2,)]
+    assert (cache.counters["stale"], cache.counters["disk_hits"]) == (0, 1)
+
+
+class FakeCollection:
+    def __init__(self, database, name, docs):
+        self.database = SimpleNamespace(name=database)
+        self.name = name
+        self.docs = docs
+
+    def find(self, query_filter):
+        return iter(self.docs)
+
+
+def test_same_collection_name_in_two_databases():
+    prod = FakeCollection("tp2", "iss", [{"n": 1}])
+    test = FakeCollection("tp2_test", "iss", [{"n": 2}, {"n": 3}])
+    cache = QueryCache()
+
+    assert len(cached_find(prod, cache=cache)) == 1
+    assert len(cached_find(test, cache=cache)) == 2
+
+    test.docs.append({"n": 4})
+    cache.invalidate(mongo_source(test))
+    assert len(cached_find(test, cache=cache)) == 3
+    assert cache.counters["hits"] == 0
+    assert len(cached_find(prod, cache=cache)) == 1
+    assert cache.counters["hits"] == 1